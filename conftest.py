@@ -0,0 +1,3 @@
+# others/ has projects with their own tests and modules of the same names
+# as ours (others/tomlockwood/wordle.py), run from their own directories.
+collect_ignore = ["others"]
@@ -4,33 +4,95 @@ import argparse
 import logging
 
 from lib.games import FrequencyGame
-from lib.games.prune import prune_wordlist
 from wordle import Guess
 
-def start_game(game_instance):
-    super(FrequencyGame, game_instance).run()
-    game_instance.targetlist = set(game_instance.orig_targetlist)
-
-def guess(game_instance):
-    game_instance.targetlist = prune_wordlist(game_instance.guesses, game_instance.targetlist)
-    candidate, score = game_instance.get_candidate(game_instance.targetlist)
-
-    guesses = get_all_candidates(game_instance, game_instance.targetlist)
-    logger.debug('candidates %s ... %d', guesses[:10], len(guesses))
-    logger.debug('guessing %s', candidate)
-    return candidate
+def feedback_pattern(code, word_length):
+    """
+    The Guess pattern of a jkoren feedback code, which packs five base 3
+    digits per byte, least significant first.
+    """
+    return [((code >> (8 * (i // 5))) & 255) // (3 ** (i % 5)) % 3 for i in range(word_length)]
+
+class FrequencyPlayer:
+    """
+    Plays in process the games that this adapter plays over stdin and stdout,
+    with the same reset(), next_guess() and observe() as solver.py's
+    SolverPlayer.
+
+    Every game starts from the same WordIndex, and the words still possible
+    are a bitset over it.
+    """
+    def __init__(self, dictionaries, expanded_list_guesses=0):
+        self.game_instance = FrequencyGame(expanded_list_guesses=expanded_list_guesses)
+        if expanded_list_guesses > 0:
+            self.game_instance.orig_targetlist = dictionaries[0]
+            if len(dictionaries) > 1:
+                self.game_instance.orig_guesslist = dictionaries[1]
+            else:
+                self.game_instance.orig_guesslist = self.game_instance.orig_targetlist
+        else:
+            self.game_instance.orig_targetlist = frozenset().union(*dictionaries)
+            self.game_instance.orig_guesslist = self.game_instance.orig_targetlist
+        self.word_index = self.game_instance.word_index(self.game_instance.orig_targetlist)
+        self.first_candidate = None
+        self.reset()
+
+    def reset(self):
+        super(FrequencyGame, self.game_instance).run()
+        self.target_bits = self.word_index.all_words()
+        self.game_instance.reset_targetlist(self.word_index)
+        self.candidate = None
+        self.applied = 0
+
+    def next_guess(self):
+        """The next guess, or None when no word is possible."""
+        game_instance = self.game_instance
+        if self.candidate is not None:
+            return self.candidate
+        if len(game_instance.guesses) == 0:
+            # every game starts with the same frequencies, and so the same guess
+            if self.first_candidate is None:
+                self.first_candidate, score = game_instance.get_candidate(game_instance.targetlist)
+            self.candidate = self.first_candidate
+        else:
+            if self.applied < len(game_instance.guesses):
+                # target_bits was pruned by every guess but the newest
+                self._set_target_bits(self.word_index.prune(game_instance.guesses[-1:], self.target_bits))
+                self.applied = len(game_instance.guesses)
+            self.candidate, score = game_instance.get_candidate(game_instance.targetlist)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            guesses = get_all_candidates(game_instance, game_instance.targetlist)
+            logger.debug('candidates %s ... %d', guesses[:10], len(guesses))
+        logger.debug('guessing %s', self.candidate)
+        return self.candidate or None
+
+    def _set_target_bits(self, bits):
+        removed = self.word_index.unroll(self.target_bits & ~bits)
+        self.game_instance.set_targetlist(self.word_index.unroll(bits), removed)
+        self.target_bits = bits
+
+    def observe(self, code):
+        """
+        Feedback code of the last guess, or None if it was not a valid word.
+        """
+        if code is None:
+            # never guess it again this game
+            if self.candidate in self.word_index.ids:
+                self._set_target_bits(self.target_bits & ~(1 << self.word_index.ids[self.candidate]))
+            if self.candidate == self.first_candidate:
+                self.first_candidate = None
+            self.candidate = None
+            return
+        self.observe_guess(Guess(self.candidate, feedback_pattern(code, len(self.candidate))))
+
+    def observe_guess(self, guess):
+        self.game_instance.guesses.append(guess)
+        self.candidate = None
 
 def get_all_candidates(game_instance, possible_guesses):
-    indexes = game_instance.letter_frequency_in_position(game_instance.targetlist)
-    scores = {}
-
-    for word in possible_guesses:
-        word_score = 0
-        for idx, letter in enumerate(word):
-            word_score += indexes[idx + 1][letter]
-        scores[word] = word_score
-
-    return sorted(scores.items(), key=lambda p: p[1], reverse=True)
+    # the same frequencies get_candidate() just used
+    return game_instance.rank_candidates(possible_guesses)
 
 def convert_feedback_to_guess(guessed_word, line):
     pattern = []
@@ -53,61 +115,53 @@ def convert_feedback_to_guess(guessed_word, line):
         pattern.append(0)
     return Guess(guessed_word, pattern)
 
-def update(game_instance, guessed_word, feedback):
-    game_instance.guesses.append(convert_feedback_to_guess(guessed_word, feedback))
+def read_dictionaries(csv, word_length):
+    dictionaries = []
+    for filename in csv.split(','):
+        filename = filename.strip()
+        with open(filename, 'r') as infile:
+            dictionaries.append(frozenset(word for word in infile.read().split("\n") if len(word) == word_length))
+    return dictionaries
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tom Lockwood's solver")
+    parser.add_argument('word_length', type=int, default=5, nargs='?', help='length of word')
+    parser.add_argument('--dictionaries', type=str, default='5_letter_wordle_targets.txt', help='CSV of dictionary files to load')
+    parser.add_argument('--expanded_list_guesses', type=int, default=0)
+    parser.add_argument('--debug', action='store_true', default=False)
+    parser.add_argument('--verbose', action='store_true', default=False)
+    return parser.parse_args(argv)
+
+def make_player(argv):
+    """FrequencyPlayer of the adapter's command line arguments argv."""
+    args = parse_args(argv)
+    return FrequencyPlayer(read_dictionaries(args.dictionaries, args.word_length), args.expanded_list_guesses)
 
 
 ##############################################################################
 logging.basicConfig()
 logger = logging.getLogger('jkoren_tomlockwood_adapter.py')
 
-parser = argparse.ArgumentParser(description="Tom Lockwood's solver")
-parser.add_argument('--dictionaries', type=str, default='5_letter_wordle_targets.txt', help='CSV of dictionary files to load')
-parser.add_argument('--expanded_list_guesses', type=int, default=0)
-parser.add_argument('--debug', action='store_true', default=False)
-parser.add_argument('--verbose', action='store_true', default=False)
-args = parser.parse_args()
-
-if args.verbose:
-    logger.setLevel(logging.INFO)
-if args.debug:
-    logger.setLevel(logging.DEBUG)
-
-dictionaries = []
-for filename in args.dictionaries.split(','):
-    filename = filename.strip()
-    dictionaries.append(set())
-    with open(filename, 'r') as infile:
-        for word in infile.read().split("\n"):
-            if len(word) > 0:
-                dictionaries[-1].add(word)
-
-game_instance = FrequencyGame(expanded_list_guesses=args.expanded_list_guesses)
-
-if args.expanded_list_guesses > 0:
-    game_instance.orig_targetlist = dictionaries[0]
-    if len(dictionaries) > 1:
-        game_instance.orig_guesslist = dictionaries[1]
-    else:
-        game_instance.orig_guesslist = game_instance.orig_targetlist
-else:
-    dd = None
-    for d in dictionaries:
-        if dd is None:
-            dd = d
-        else:
-            dd = dd.union(d)
-    game_instance.orig_targetlist = dd
-    game_instance.orig_guesslist = game_instance.orig_targetlist
-
-start_game(game_instance)
-while True:
-    guessed_word = guess(game_instance)
-    if len(guessed_word) == 0:
-        print('OUT OF GUESSES')
-    else:
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.INFO)
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+
+    player = FrequencyPlayer(read_dictionaries(args.dictionaries, args.word_length), args.expanded_list_guesses)
+    while True:
+        guessed_word = player.next_guess()
+        if guessed_word is None:
+            print('OUT OF GUESSES')
+            player.reset()
+            continue
         print(guessed_word)
-    feedback = input() # feedback is a jkoren wordle string or 'YOU LOSE' or 'YOU WIN'
-    update(game_instance, guessed_word, feedback)
-    if feedback == 'CORRECT' or feedback == 'YOU LOSE':
-        start_game(game_instance)
+        feedback = input() # feedback is a jkoren wordle string or 'INVALID WORD' or 'CORRECT' or 'YOU LOSE'
+        if feedback == 'CORRECT' or feedback == 'YOU LOSE':
+            player.reset()
+        elif feedback == 'INVALID WORD':
+            player.observe(None)
+        else:
+            player.observe_guess(convert_feedback_to_guess(guessed_word, feedback))
@@ -1 +1,6 @@
-from .words import targetlist, guesslist
+from . import words
+
+
+def __getattr__(name):
+    # targetlist and guesslist are only loaded when used
+    return getattr(words, name)
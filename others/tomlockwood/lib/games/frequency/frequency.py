@@ -1,13 +1,121 @@
 from ..game import Game
-from ..prune import prune_wordlist
-from ...words import targetlist, guesslist
+from ..validate import WordIndex
+from ... import words as default_words
+import array
+import operator
 import string
+import sys
 
 zero_alpha = {k: 0 for k in string.ascii_lowercase}
 
 
-def make_indexes() -> dict:
-    return {k + 1: zero_alpha.copy() for k in range(5)}
+def make_indexes(word_length=5) -> dict:
+    return {k + 1: zero_alpha.copy() for k in range(word_length)}
+
+
+def letter_columns(wordlist, word_length=5) -> list:
+    """
+    The letter codes of every word of wordlist, one bytes per position, so
+    column[idx][i] is the idx'th letter of the i'th word.
+    """
+    joined = "".join(wordlist).encode("ascii")
+    return [joined[idx::word_length] for idx in range(word_length)]
+
+
+# array typecodes by number of bytes per item
+lane_typecodes = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+
+class PositionFrequencies:
+    """
+    How often each letter is at each position over a word list, kept in a
+    flat array of word_length * 26 counts so it can be updated as words are
+    added or removed instead of being rebuilt.
+    """
+    def __init__(self, wordlist=(), word_length=5):
+        self.word_length = word_length
+        self.counts = array.array("l", [0]) * (word_length * 26)
+        self._tables = None
+        self._byte_tables = {}
+        self.add(wordlist)
+
+    def copy(self):
+        frequencies = PositionFrequencies(word_length=self.word_length)
+        frequencies.counts = array.array("l", self.counts)
+        return frequencies
+
+    def _update(self, wordlist, amount):
+        self._tables = None
+        self._byte_tables = {}
+        counts = self.counts
+        for word in wordlist:
+            for idx, letter in enumerate(word):
+                counts[idx * 26 + ord(letter) - 97] += amount
+
+    def add(self, wordlist):
+        self._update(wordlist, 1)
+
+    def remove(self, wordlist):
+        self._update(wordlist, -1)
+
+    def position_tables(self) -> list:
+        """
+        A dict of letter to count per position, rebuilt only after an update,
+        for scoring many words with sum(map(operator.getitem, tables, word)).
+        """
+        if self._tables is None:
+            self._tables = []
+            for idx in range(self.word_length):
+                row = self.counts[idx * 26:(idx + 1) * 26]
+                self._tables.append(dict(zip(string.ascii_lowercase, row)))
+        return self._tables
+
+    def score(self, word) -> int:
+        return sum(map(operator.getitem, self.position_tables(), word))
+
+    def byte_tables(self, lane) -> list:
+        """
+        bytes.translate tables giving, for each position and each byte of a
+        lane bytes wide count, that byte of the count of each letter.
+        """
+        if lane not in self._byte_tables:
+            tables = []
+            for idx in range(self.word_length):
+                row = self.counts[idx * 26:(idx + 1) * 26]
+                for shift in range(0, 8 * lane, 8):
+                    table = bytearray(256)
+                    table[97:123] = bytes((count >> shift) & 255 for count in row)
+                    tables.append(bytes(table))
+            self._byte_tables[lane] = tables
+        return self._byte_tables[lane]
+
+    def scores(self, columns) -> array.array:
+        """
+        score() of every word of letter_columns(), in the same order.
+
+        Each column is translated into the counts of its letters, laid out as
+        one little lane per word of a big integer, and the columns summed as
+        integers. The lanes are wide enough for the largest possible score,
+        so they never carry into each other.
+        """
+        size = len(columns[0]) if columns else 0
+        highest = max(self.counts, default=0) * self.word_length
+        lane = next(k for k in sorted(lane_typecodes) if highest < 1 << (8 * k))
+        tables = self.byte_tables(lane)
+        buffer = bytearray(size * lane)
+        total = 0
+        for idx, column in enumerate(columns):
+            for k in range(lane):
+                buffer[k::lane] = column.translate(tables[idx * lane + k])
+            total += int.from_bytes(buffer, "little")
+        result = array.array(lane_typecodes[lane])
+        result.frombytes(total.to_bytes(size * lane, "little"))
+        if sys.byteorder == "big":
+            result.byteswap()
+        return result
+
+    def as_indexes(self) -> dict:
+        return {idx + 1: dict(table) for idx, table in enumerate(self.position_tables())}
 
 
 class FrequencyGame(Game):
@@ -18,57 +126,149 @@ class FrequencyGame(Game):
         kwargs["expanded_list_guesses"] = expanded_list_guesses
         self.expanded_list_guesses = expanded_list_guesses
 
-        self.orig_targetlist = targetlist
-        self.orig_guesslist = guesslist
+        self._orig_targetlist = None
+        self._orig_guesslist = None
+        self._word_indexes = {}
+        self._initial_frequencies = {}
+        self.targetlist = None
+        self.frequencies = None
+        self._frequencies_of = None
 
         super().__init__(**kwargs)
 
     def __str__(self):
         return super().__str__()
 
+    @property
+    def orig_targetlist(self):
+        if self._orig_targetlist is None:
+            self._orig_targetlist = default_words.targetlist
+        return self._orig_targetlist
+
+    @orig_targetlist.setter
+    def orig_targetlist(self, wordlist):
+        self._orig_targetlist = wordlist
+
+    @property
+    def orig_guesslist(self):
+        if self._orig_guesslist is None:
+            self._orig_guesslist = default_words.guesslist
+        return self._orig_guesslist
+
+    @orig_guesslist.setter
+    def orig_guesslist(self, wordlist):
+        self._orig_guesslist = wordlist
+
+    def word_index(self, *wordlists) -> WordIndex:
+        """
+        WordIndex of the union of wordlists, built once per combination of
+        lists. The words are sorted, so ties between candidates go the same
+        way whatever the hash order of the lists.
+        """
+        key = tuple(id(wordlist) for wordlist in wordlists)
+        if key not in self._word_indexes or any(a is not b for a, b in zip(self._word_indexes[key][0], wordlists)):
+            words = set().union(*wordlists)
+            self._word_indexes[key] = (wordlists, WordIndex(sorted(words)))
+        return self._word_indexes[key][1]
+
     def letter_frequency_in_position(self, wordlist) -> dict:
-        indexes = make_indexes()
+        word_length = max(map(len, wordlist), default=5)
+        return PositionFrequencies(wordlist, word_length).as_indexes()
 
-        for word in wordlist:
-            for idx, letter in enumerate(word):
-                indexes[idx + 1][letter] += 1
+    def position_frequencies(self) -> PositionFrequencies:
+        """
+        Frequencies of self.targetlist, only rebuilt if targetlist was
+        replaced without set_targetlist().
+        """
+        if self._frequencies_of is not self.targetlist:
+            word_length = max(map(len, self.targetlist), default=5)
+            self.frequencies = PositionFrequencies(self.targetlist, word_length)
+            self._frequencies_of = self.targetlist
+        return self.frequencies
+
+    def set_targetlist(self, targetlist, removed):
+        """
+        Replace self.targetlist by a subset of it, removed being the words
+        left out, updating the frequencies by whichever of the two is smaller.
+        """
+        frequencies = self.position_frequencies()
+        if len(removed) <= len(targetlist):
+            frequencies.remove(removed)
+        else:
+            frequencies = PositionFrequencies(targetlist, frequencies.word_length)
+        self.targetlist = targetlist
+        self.frequencies = frequencies
+        self._frequencies_of = targetlist
 
-        return indexes
+    def reset_targetlist(self, word_index):
+        """
+        Set self.targetlist to every word of word_index, reusing its
+        frequencies from earlier games.
+        """
+        key = id(word_index)
+        if key not in self._initial_frequencies or self._initial_frequencies[key][0] is not word_index:
+            frequencies = PositionFrequencies(word_index.words, word_index.word_length)
+            self._initial_frequencies[key] = (word_index, frequencies)
+        self.targetlist = word_index.words
+        self.frequencies = self._initial_frequencies[key][1].copy()
+        self._frequencies_of = self.targetlist
 
     def get_candidate(self, possible_guesses) -> str:
         """
         Return best candidate for next guess.
         """
-        indexes = self.letter_frequency_in_position(self.targetlist)
+        words = list(possible_guesses)
+        if len(words) == 0:
+            return "", 0
+        frequencies = self.position_frequencies()
+        scores = frequencies.scores(letter_columns(words, frequencies.word_length))
+        max_word_score = max(scores)
+        if max_word_score == 0:
+            return "", 0
+        return words[scores.index(max_word_score)], max_word_score
 
-        max_word = ""
-        max_word_score = 0
-
-        for word in possible_guesses:
-            word_score = 0
-            for idx, letter in enumerate(word):
-                word_score += indexes[idx + 1][letter]
-            if word_score > max_word_score:
-                max_word_score = word_score
-                max_word = word
-
-        return max_word, max_word_score
+    def rank_candidates(self, possible_guesses) -> list:
+        """
+        Every word of possible_guesses with its score, best first.
+        """
+        words = list(possible_guesses)
+        if len(words) == 0:
+            return []
+        frequencies = self.position_frequencies()
+        scores = frequencies.scores(letter_columns(words, frequencies.word_length))
+        return sorted(zip(words, scores), key=operator.itemgetter(1), reverse=True)
 
     def run(self, target):
         super().run()
-        self.targetlist = self.orig_targetlist
-        self.guesslist = set.union(self.orig_targetlist, self.orig_guesslist)
+        max_guesses = len(target) + 1
+        target_index = self.word_index(self.orig_targetlist)
+        target_bits = target_index.all_words()
+        self.reset_targetlist(target_index)
+        if self.expanded_list_guesses > 0:
+            guess_index = self.word_index(self.orig_targetlist, self.orig_guesslist)
+            guess_bits = guess_index.all_words()
+            self.guesslist = guess_index.words
         for _ in range(self.expanded_list_guesses):
-            self.targetlist = prune_wordlist(self.guesses, self.targetlist)
-            self.guesslist = prune_wordlist(self.guesses, self.guesslist)
+            if len(self.guesses) > 0:
+                # both lists were already pruned by all but the newest guess
+                pruned_bits = target_index.prune(self.guesses[-1:], target_bits)
+                guess_bits = guess_index.prune(self.guesses[-1:], guess_bits)
+                self.set_targetlist(target_index.unroll(pruned_bits), target_index.unroll(target_bits & ~pruned_bits))
+                target_bits = pruned_bits
+                self.guesslist = guess_index.unroll(guess_bits)
             candidate, score = self.get_candidate(self.guesslist)
             guess = self.guess(candidate, target)
             if guess.won:
                 return
-        self.targetlist = self.orig_targetlist
-        for _ in range(6 - self.expanded_list_guesses):
-            self.targetlist = prune_wordlist(self.guesses, self.targetlist)
+        # target_bits has been pruned by all but the newest guess
+        unapplied = self.guesses[-1:]
+        for _ in range(max_guesses - self.expanded_list_guesses):
+            if len(unapplied) > 0:
+                pruned_bits = target_index.prune(unapplied, target_bits)
+                self.set_targetlist(target_index.unroll(pruned_bits), target_index.unroll(target_bits & ~pruned_bits))
+                target_bits = pruned_bits
             candidate, score = self.get_candidate(self.targetlist)
             guess = self.guess(candidate, target)
             if guess.won:
                 return
+            unapplied = self.guesses[-1:]
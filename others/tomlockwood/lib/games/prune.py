@@ -1,17 +1,25 @@
-from .validate import validate
+from .validate import Constraints
 
 
-def prune_wordlist(guesses, wordlist) -> set:
+def prune_wordlist(guesses, wordlist, newest_only=False) -> set:
+    """
+    Keep the words of wordlist that are possible given guesses. When wordlist
+    has already been pruned by all but the newest guess, newest_only skips
+    checking the older ones again.
+    """
     if len(guesses) == 0:
         return wordlist
-    guess_words = [guess.word for guess in guesses]
+    if newest_only:
+        guesses = guesses[-1:]
+    guess_words = {guess.word for guess in guesses}
+    constraints = Constraints(guesses)
 
     possibles = set()
 
     for word in wordlist:
         if word in guess_words:
             continue
-        if validate(word, guesses):
+        if constraints.check(word):
             possibles.add(word)
 
     return possibles
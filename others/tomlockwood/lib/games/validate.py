@@ -1,7 +1,9 @@
 import string
 
 zero_alpha = {k: 0 for k in string.ascii_lowercase}
-five_alpha = {k: 5 for k in string.ascii_lowercase}
+letter_mask = {k: 1 << i for i, k in enumerate(string.ascii_lowercase)}
+all_letters_mask = (1 << len(string.ascii_lowercase)) - 1
+binary_digits = bytes.maketrans(b"\x00\x01", b"01")
 
 def validate(word, guesses):
     # Get a dict of what letters exist in the word
@@ -28,7 +30,7 @@ def validate(word, guesses):
             if char in [2,1]:
                 alphabet_min[guess_word_char] += 1
 
-        alphabet_max = five_alpha.copy()
+        alphabet_max = {k: len(word) for k in string.ascii_lowercase}
         for idx, char in enumerate(guess.pattern):
             guess_word_char = guess.word[idx]
             if char == 0:
@@ -43,3 +45,127 @@ def validate(word, guesses):
             if amount < alphabet_min[char]:
                 return False
     return True
+
+
+class Constraints:
+    """
+    The rules of validate() for a list of guesses compiled into a single
+    object: the letters allowed at each position as a bitmask over the
+    alphabet, and the minimum and maximum count of each constrained letter.
+    """
+    def __init__(self, guesses, word_length=5):
+        if len(guesses) > 0:
+            word_length = len(guesses[0].word)
+        self.allowed = [all_letters_mask] * word_length
+        self.alphabet_min = {}
+        self.alphabet_max = {}
+        for guess in guesses:
+            guess_min = {}
+            for idx, char in enumerate(guess.pattern):
+                guess_word_char = guess.word[idx]
+                if char == 2:
+                    self.allowed[idx] &= letter_mask[guess_word_char]
+                if char == 1:
+                    self.allowed[idx] &= ~letter_mask[guess_word_char]
+                if char in [2,1]:
+                    guess_min[guess_word_char] = guess_min.get(guess_word_char, 0) + 1
+            for char, amount in guess_min.items():
+                self.alphabet_min[char] = max(self.alphabet_min.get(char, 0), amount)
+            for idx, char in enumerate(guess.pattern):
+                guess_word_char = guess.word[idx]
+                if char == 0:
+                    amount = min(self.alphabet_max.get(guess_word_char, word_length), guess_min.get(guess_word_char, 0))
+                    self.alphabet_max[guess_word_char] = amount
+                    if amount == 0:
+                        # the letter can not be anywhere
+                        for position in range(word_length):
+                            self.allowed[position] &= ~letter_mask[guess_word_char]
+
+    def check(self, word):
+        for idx, char in enumerate(word):
+            if not self.allowed[idx] & letter_mask[char]:
+                return False
+        for char, amount in self.alphabet_min.items():
+            if word.count(char) < amount:
+                return False
+        for char, amount in self.alphabet_max.items():
+            if word.count(char) > amount:
+                return False
+        return True
+
+
+class WordIndex:
+    """
+    Bitsets over a fixed list of words, one bit per word, so Constraints can
+    be checked against every word at once with a few big integer operations
+    instead of a call per word.
+    """
+    def __init__(self, wordlist):
+        self.words = list(wordlist)
+        self.word_length = max(map(len, self.words), default=5)
+        self.ids = {word: i for i, word in enumerate(self.words)}
+        encoded = [bytes(word, "ascii") for word in self.words]
+        self.columns = [bytes(word[idx] for word in encoded) for idx in range(self.word_length)]
+        self.counts = {}
+        self.bitsets = {}
+
+    def all_words(self):
+        return (1 << len(self.words)) - 1
+
+    def _bitset(self, key, flags):
+        # flags has a 1 byte for each word in the set; reversed so the first
+        # word is the lowest bit
+        if key not in self.bitsets:
+            self.bitsets[key] = int(b"0" + flags.translate(binary_digits)[::-1], 2)
+        return self.bitsets[key]
+
+    def at_position(self, idx, char):
+        table = bytearray(256)
+        table[ord(char)] = 1
+        return self._bitset(("at", idx, char), self.columns[idx].translate(table))
+
+    def at_least(self, char, amount):
+        if char not in self.counts:
+            self.counts[char] = bytes(word.count(char) for word in self.words)
+        table = bytes(1 if c >= amount else 0 for c in range(256))
+        return self._bitset(("count", char, amount), self.counts[char].translate(table))
+
+    def matching(self, constraints, bits=None):
+        """Bitset of the words (of bits, or all) that satisfy constraints."""
+        if bits is None:
+            bits = self.all_words()
+        for idx, allowed in enumerate(constraints.allowed):
+            if allowed == all_letters_mask:
+                continue
+            letters = [k for k in string.ascii_lowercase if allowed & letter_mask[k]]
+            if len(letters) <= len(string.ascii_lowercase) // 2:
+                position_bits = 0
+                for char in letters:
+                    position_bits |= self.at_position(idx, char)
+                bits &= position_bits
+            else:
+                for char in string.ascii_lowercase:
+                    if not allowed & letter_mask[char]:
+                        bits &= ~self.at_position(idx, char)
+        for char, amount in constraints.alphabet_min.items():
+            bits &= self.at_least(char, amount)
+        for char, amount in constraints.alphabet_max.items():
+            bits &= ~self.at_least(char, amount + 1)
+        return bits
+
+    def prune(self, guesses, bits=None):
+        """prune_wordlist() over a bitset of words."""
+        bits = self.matching(Constraints(guesses, self.word_length), bits)
+        for guess in guesses:
+            if guess.word in self.ids:
+                bits &= ~(1 << self.ids[guess.word])
+        return bits
+
+    def unroll(self, bits):
+        digits = bin(bits)[:1:-1]
+        words = []
+        i = digits.find("1")
+        while i >= 0:
+            words.append(self.words[i])
+            i = digits.find("1", i + 1)
+        return words
@@ -0,0 +1,31 @@
+import wordle
+from jkoren_tomlockwood_adapter import FrequencyPlayer, feedback_pattern
+
+words = ["cigar", "rebut", "sissy", "humph", "awake", "blush", "focal", "evade", "naval", "serve", "sassy", "missy"]
+
+
+def feedback_code(guess, target):
+    # jkoren's encoding, five base 3 digits per byte
+    pattern = wordle.play(guess, target).pattern
+    return sum(digit * 3 ** (idx % 5) << (8 * (idx // 5)) for idx, digit in enumerate(pattern))
+
+
+def test_feedback_pattern():
+    for guess, target in [("sassy", "missy"), ("banana", "cabana")]:
+        assert feedback_pattern(feedback_code(guess, target), len(guess)) == wordle.play(guess, target).pattern
+
+
+def test_frequency_player():
+    player = FrequencyPlayer([frozenset(words)])
+    for target in words:
+        player.reset()
+        for _ in range(len(target) + 1):
+            guess = player.next_guess()
+            if guess == target:
+                break
+            player.observe(feedback_code(guess, target))
+        assert guess == target
+    player.reset()
+    rejected = player.next_guess()
+    player.observe(None)
+    assert player.next_guess() not in (rejected, None)
@@ -0,0 +1,48 @@
+import wordle
+from lib.games.prune import prune_wordlist
+from lib.games.validate import validate, Constraints, WordIndex
+
+words = {"cigar", "rebut", "sissy", "humph", "awake", "blush", "focal", "evade", "naval", "serve", "sassy", "missy"}
+
+
+def test_constraints_match_validate():
+    for guessed in ["sassy", "essay", "civic", "naval"]:
+        for target in words:
+            guesses = [wordle.play(guessed, target), wordle.play("serve", target)]
+            constraints = Constraints(guesses)
+            index = WordIndex(words)
+            matching = set(index.unroll(index.matching(constraints)))
+            for word in words:
+                assert constraints.check(word) == validate(word, guesses)
+                assert (word in matching) == validate(word, guesses)
+
+
+def test_prune_newest_only():
+    guesses = [wordle.play("essay", "sissy"), wordle.play("sassy", "sissy")]
+    pruned = prune_wordlist(guesses[:1], words)
+    assert prune_wordlist(guesses, pruned, newest_only=True) == prune_wordlist(guesses, words)
+    assert prune_wordlist(guesses, words) == {w for w in words if validate(w, guesses)} - {"essay", "sassy"}
+    index = WordIndex(words)
+    assert set(index.unroll(index.prune(guesses))) == prune_wordlist(guesses, words)
+
+
+def test_position_frequencies_incremental():
+    from lib.games.frequency.frequency import PositionFrequencies, FrequencyGame
+    guesses = [wordle.play("essay", "sissy")]
+    pruned = prune_wordlist(guesses, words)
+    frequencies = PositionFrequencies(words)
+    frequencies.remove(words - pruned)
+    assert frequencies.counts == PositionFrequencies(pruned).counts
+    assert frequencies.as_indexes() == FrequencyGame().letter_frequency_in_position(pruned)
+
+
+def test_position_frequencies_scores():
+    from lib.games.frequency.frequency import PositionFrequencies, FrequencyGame, letter_columns
+    wordlist = sorted(words)
+    frequencies = PositionFrequencies(wordlist * 100)
+    assert list(frequencies.scores(letter_columns(wordlist))) == [frequencies.score(w) for w in wordlist]
+    game = FrequencyGame()
+    game.targetlist = wordlist
+    ranking = game.rank_candidates(wordlist)
+    assert ranking == sorted(((w, game.frequencies.score(w)) for w in wordlist), key=lambda p: p[1], reverse=True)
+    assert game.get_candidate(wordlist) == ranking[0]
@@ -8,4 +8,14 @@ def test_wordle_play():
     for triplet in triplets:
         assert str(wordle.play(triplet[0],triplet[1])) == f"{triplet[0]}: {triplet[2]}"
 
-    
\ No newline at end of file
+    
+
+def test_wordle_play_any_length():
+    triplets = [
+        ["bees","ebbs","1102"],
+        ["banana","cabana","120222"],
+    ]
+    for triplet in triplets:
+        assert str(wordle.play(triplet[0],triplet[1])) == f"{triplet[0]}: {triplet[2]}"
+    assert wordle.play("banana","banana").won
+    assert not wordle.play("banana","cabana").won
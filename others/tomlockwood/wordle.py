@@ -21,14 +21,14 @@ class Guess:
 
     @property
     def won(self):
-        return self.pattern_string == "22222"
+        return all(x == 2 for x in self.pattern)
 
     def __repr__(self):
         return f"{self.word}: {self.pattern_string}"
 
 
 def play(guess, target) -> Guess:
-    pattern = [0, 0, 0, 0, 0]
+    pattern = [0] * len(guess)
     target_alphabet = zero_alpha.copy()
     for char in target:
         target_alphabet[char] += 1
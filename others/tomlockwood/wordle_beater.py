@@ -1,37 +1,91 @@
+import argparse
+import concurrent.futures
+import os
 import time
 from lib import targetlist
 from lib.games import FrequencyGame
 
+games = [
+    (FrequencyGame, {"expanded_list_guesses": 0}),
+    (FrequencyGame, {"expanded_list_guesses": 1}),
+    (FrequencyGame, {"expanded_list_guesses": 2}),
+    (FrequencyGame, {"expanded_list_guesses": 3}),
+    (FrequencyGame, {"expanded_list_guesses": 4}),
+    (FrequencyGame, {"expanded_list_guesses": 5}),
+    (FrequencyGame, {"expanded_list_guesses": 6}),
+]
+
+# Game instances of the worker process, one per configuration, so their
+# word indexes are built once rather than once per shard.
+game_instances = {}
+
+
+def prepare_games():
+    """
+    Create the game instance of every configuration with the word lists and
+    word indexes its runs use, so workers forked afterwards start with them.
+    """
+    for game_number, (game, opts) in enumerate(games):
+        game_instance = game(**opts)
+        game_instance.word_index(game_instance.orig_targetlist)
+        if game_instance.expanded_list_guesses > 0:
+            game_instance.word_index(game_instance.orig_targetlist, game_instance.orig_guesslist)
+        game_instances[game_number] = game_instance
+
+
+def empty_result() -> dict:
+    result = {k + 1: 0 for k in range(6)}
+    result["losses"] = 0
+    return result
+
+
+def play_shard(game_number, words) -> dict:
+    if game_number not in game_instances:
+        game, opts = games[game_number]
+        game_instances[game_number] = game(**opts)
+    game_instance = game_instances[game_number]
+    result = empty_result()
+    for word in words:
+        game_instance.run(word)
+        guesses = game_instance.guesses
+        if not guesses[-1].won:
+            result["losses"] += 1
+            # Show me the losses:
+            # print(f"{word}: {guesses}")
+        else:
+            result[len(guesses)] += 1
+    return result
+
 
 def main():
-    games = [
-        (FrequencyGame, {"expanded_list_guesses": 0}),
-        # (FrequencyGame, {"expanded_list_guesses": 1}),
-        # (FrequencyGame, {"expanded_list_guesses": 2}),
-        # (FrequencyGame, {"expanded_list_guesses": 3}),
-        # (FrequencyGame, {"expanded_list_guesses": 4}),
-        # (FrequencyGame, {"expanded_list_guesses": 5}),
-        # (FrequencyGame, {"expanded_list_guesses": 6}),
-    ]
+    parser = argparse.ArgumentParser(description="Play every configuration against every target word")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of processes")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
 
     results = {
-        f"{game.__name__} - {opts}": {k + 1: 0 for k in range(6)}
+        f"{game.__name__} - {opts}": empty_result()
         for game, opts in games
     }
-    for _, v in results.items():
-        v["losses"] = 0
-    for game, opts in games:
-        game_string = f"{game.__name__} - {opts}"
-        game_instance = game(**opts)
-        for word in targetlist:
-            game_instance.run(word)
-            guesses = game_instance.guesses
-            if not guesses[-1].won:
-                results[game_string]["losses"] += 1
-                # Show me the losses:
-                # print(f"{word}: {guesses}")
-            else:
-                results[game_string][len(guesses)] += 1
+    words = sorted(targetlist)
+    shards = [words[i::args.workers * 4] for i in range(args.workers * 4)]
+    work = [(game_number, shard) for game_number in range(len(games)) for shard in shards]
+
+    # The word lists and indexes are built before the pool forks, so the
+    # workers share the parent's copy rather than each building their own.
+    prepare_games()
+    if args.workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(args.workers) as executor:
+            futures = {executor.submit(play_shard, *w): w[0] for w in work}
+            shard_results = [(futures[f], f.result()) for f in concurrent.futures.as_completed(futures)]
+    else:
+        shard_results = [(w[0], play_shard(*w)) for w in work]
+
+    for game_number, result in shard_results:
+        game, opts = games[game_number]
+        for k, v in result.items():
+            results[f"{game.__name__} - {opts}"][k] += v
 
     print(results)
 
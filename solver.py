@@ -1,9 +1,18 @@
 #!/usr/bin/env python3
 
 import argparse
+import array
+import asyncio
+import collections
+import hashlib
 import math
+import mmap
+import operator
 import random
 import re
+import signal
+import socket
+import stat
 import sys
 import time
 import os.path
@@ -61,12 +70,382 @@ class Dictionary:
     def unroll(self, ids):
         return map(lambda id: self.words[id], ids)
 
+def position_weight(i):
+    """Feedback digits are packed five to a byte, so the feedback of a word of
+    any length is a little endian integer of one byte per five letters. For
+    words of at most five letters it is simply a base 3 integer."""
+    return (3 ** (i % 5)) << (8 * (i // 5))
+
+def feedback_digit(code, i):
+    """Returns the feedback of position i: 0 (miss), 1 (wrong position), or
+    2 (correct position)."""
+    return (((code >> (8 * (i // 5))) & 255) // (3 ** (i % 5))) % 3
+
+def feedback_code(guess, target):
+    """Returns the feedback of guess against target as an integer, where
+    position i contributes position_weight(i) times its digit."""
+    unmatched = {}
+    for (g, t) in zip(guess, target):
+        if g != t:
+            unmatched[t] = unmatched.get(t, 0) + 1
+    code = 0
+    for (i, (g, t)) in enumerate(zip(guess, target)):
+        if g == t:
+            code += 2 * position_weight(i)
+        elif unmatched.get(g, 0) > 0:
+            unmatched[g] -= 1
+            code += position_weight(i)
+    return code
+
+def parse_feedback(line):
+    """Converts a feedback line such as `a?rose*` into (word, feedback_code)."""
+    word = ''
+    code = 0
+    for l in line:
+        if l == ' ':
+            continue
+        elif l == '?' or l == '*':
+            if len(word) > 0:
+                code += position_weight(len(word) - 1) * (1 if l == '?' else 2)
+        else:
+            word += l
+    return (word, code)
+
+def format_feedback(word, code):
+    """Inverse of parse_feedback()."""
+    resp = ''
+    for (i, c) in enumerate(word):
+        resp += c + ['', '?', '*'][feedback_digit(code, i)]
+    return resp
+
+FEEDBACK_FIELD = re.compile(r'([a-z][?*]?)+')
+
+def feedback_line_error(line, word_length, boards=1):
+    """Why line is not a feedback line of the text protocol for words of
+    word_length and boards boards, or None if it is one."""
+    fields = line.replace(' ', '').split(',')
+    if len(fields) != boards:
+        return f'expected the feedback of {boards} boards'
+    for field in fields:
+        if boards > 1 and field == 'CORRECT':
+            continue
+        if FEEDBACK_FIELD.fullmatch(field) is None or len(parse_feedback(field)[0]) != word_length:
+            return f'bad feedback {field}, expected {word_length} letters each followed by an optional ? or *'
+    return None
+
+def winning_code(word_length):
+    return sum(2 * position_weight(i) for i in range(word_length))
+
+def code_bytes(word_length):
+    return (word_length + 4) // 5
+
+def hard_mode_requirements(word, code):
+    """Returns the (greens, minimum_counts) that hard mode imposes on every
+    later guess once word has received code. greens is a list of
+    (position, letter), and minimum_counts maps letters to how many times they
+    must be used."""
+    greens = []
+    minimum_counts = {}
+    for (i, letter) in enumerate(word):
+        digit = feedback_digit(code, i)
+        if digit == 2:
+            greens.append((i, letter))
+        if digit > 0:
+            minimum_counts[letter] = minimum_counts.get(letter, 0) + 1
+    return (greens, minimum_counts)
+
+def is_hard_mode_guess(guess, history):
+    """True if guess uses every hint revealed by the (word, code) history."""
+    for (word, code) in history:
+        (greens, minimum_counts) = hard_mode_requirements(word, code)
+        for (position, letter) in greens:
+            if guess[position] != letter:
+                return False
+        for (letter, count) in minimum_counts.items():
+            if guess.count(letter) < count:
+                return False
+    return True
+
+def bitset_ids(bits):
+    """Returns the positions of the set bits of an int, in ascending order."""
+    return [i for (i, b) in enumerate(bin(bits)[:1:-1]) if b == '1']
+
+# _DIGIT_TABLES[(k, idx)] maps the key built in FeedbackMatrix._compute_row()
+# for a letter occurring k times in the guess to the feedback digit of its
+# idx-th occurrence.
+_DIGIT_TABLES = {}
+
+def _digit_table(k, idx):
+    if (k, idx) not in _DIGIT_TABLES:
+        table = bytearray(256)
+        for key in range((k + 1) << k):
+            count = key >> k
+            greens = key & ((1 << k) - 1)
+            if greens & (1 << idx):
+                table[key] = 2
+            else:
+                yellows = count - bin(greens).count('1')
+                rank = idx - bin(greens & ((1 << idx) - 1)).count('1')
+                table[key] = 1 if rank < yellows else 0
+        _DIGIT_TABLES[(k, idx)] = bytes(table)
+    return _DIGIT_TABLES[(k, idx)]
+
+_CLIP_TABLES = {}
+
+def _clip_table(k):
+    if k not in _CLIP_TABLES:
+        _CLIP_TABLES[k] = bytes(min(c, k) << k for c in range(256))
+    return _CLIP_TABLES[k]
+
+# Rows of feedback matrices larger than this are recomputed rather than cached
+MAX_CACHED_MATRIX_BYTES = 1 << 28
+
+# array typecodes holding codes of 2, 4, and 8 bytes
+_CODE_TYPECODES = {}
+for typecode in 'HILQ':
+    _CODE_TYPECODES.setdefault(array.array(typecode).itemsize, typecode)
+
+class FeedbackMatrix:
+    """Feedback codes of every word in a guess pool against every word in a
+    target pool.
+
+    The pools may differ, so the matrix is asymmetric. Rows are built lazily,
+    as bytes when codes fit in one byte (at most five letters), and as arrays
+    of 2, 4 or 8 byte integers otherwise. Rows are cached unless the whole
+    matrix would exceed MAX_CACHED_MATRIX_BYTES. With map_file() every row is
+    instead read from a file mapped into memory, which every process mapping
+    the same matrix shares.
+
+    Each row is computed a letter at a time for all targets at once by
+    translating byte columns of the target pool and summing them as big
+    integers, one per byte of the code, which never carry because every byte
+    of a code holds at most five digits."""
+
+    def __init__(self, guess_words, target_words):
+        self.guess_words = list(guess_words)
+        self.target_words = list(target_words)
+        self.guess_index = {word: i for (i, word) in enumerate(self.guess_words)}
+        self.target_index = {word: i for (i, word) in enumerate(self.target_words)}
+        self.word_length = len(self.target_words[0]) if len(self.target_words) > 0 else 0
+        self.code_bytes = code_bytes(self.word_length)
+        self.typecode = None
+        if self.code_bytes > 1:
+            width = min(filter(lambda w: w >= self.code_bytes, _CODE_TYPECODES.keys()), default=None)
+            if width is None:
+                raise ValueError(f'feedback codes of {self.word_length} letter words are too wide')
+            self.typecode = _CODE_TYPECODES[width]
+        self.cache_rows = len(self.guess_words) * len(self.target_words) * self.code_width() <= MAX_CACHED_MATRIX_BYTES
+        encoded = [bytes(word, 'ascii') for word in self.target_words]
+        self._columns = [bytes(word[i] for word in encoded) for i in range(self.word_length)]
+        self._letter_counts = {}
+        self._rows = {}
+        self._guess_bits = {}
+        self._file_dir = None
+        self._mapped = None
+        self._written = None
+
+    def code_width(self):
+        if self.typecode is None:
+            return 1
+        return array.array(self.typecode).itemsize
+
+    def pack(self, codes):
+        """Returns the row type holding codes."""
+        if self.typecode is None:
+            return bytes(codes)
+        return array.array(self.typecode, codes)
+
+    def subset(self, target_ids):
+        """Returns the matrix of the same guess pool against only the given
+        targets."""
+        return FeedbackMatrix(self.guess_words, map(lambda t: self.target_words[t], target_ids))
+
+    def _bits(self, key, predicate):
+        """Bitset of the guess ids whose word satisfies predicate."""
+        if key not in self._guess_bits:
+            self._guess_bits[key] = int(''.join('1' if predicate(word) else '0' for word in reversed(self.guess_words)), 2)
+        return self._guess_bits[key]
+
+    def all_guesses(self):
+        return (1 << len(self.guess_words)) - 1
+
+    def hard_mode_guesses(self, word, code):
+        """Bitset of the guess ids that hard mode allows after word received
+        code."""
+        (greens, minimum_counts) = hard_mode_requirements(word, code)
+        allowed = self.all_guesses()
+        for (position, letter) in greens:
+            allowed &= self._bits(('green', position, letter), lambda w: w[position] == letter)
+        for (letter, count) in minimum_counts.items():
+            allowed &= self._bits(('count', letter, count), lambda w: w.count(letter) >= count)
+        return allowed
+
+    def _counts(self, letter):
+        if letter not in self._letter_counts:
+            self._letter_counts[letter] = bytes(word.count(letter) for word in self.target_words)
+        return self._letter_counts[letter]
+
+    def _compute_row(self, guess):
+        num_targets = len(self.target_words)
+        positions = {}
+        for (i, letter) in enumerate(guess):
+            positions.setdefault(letter, []).append(i)
+        if max(map(len, positions.values()), default=0) > 5:
+            # the keys below would not fit in a byte
+            return self.pack(feedback_code(guess, target) for target in self.target_words)
+
+        totals = [0] * self.code_bytes
+        for (letter, where) in positions.items():
+            k = len(where)
+            # key = min(count of letter in target, k) * 2**k + green bitmask
+            key = int.from_bytes(self._counts(letter).translate(_clip_table(k)), 'little')
+            for (idx, position) in enumerate(where):
+                green = bytearray(256)
+                green[ord(letter)] = 1 << idx
+                key += int.from_bytes(self._columns[position].translate(green), 'little')
+            key = key.to_bytes(num_targets, 'little')
+            for (idx, position) in enumerate(where):
+                digits = int.from_bytes(key.translate(_digit_table(k, idx)), 'little')
+                totals[position // 5] += digits * (3 ** (position % 5))
+
+        if self.typecode is None:
+            return totals[0].to_bytes(num_targets, 'little')
+        # interleave the bytes of the codes into little endian integers
+        width = self.code_width()
+        interleaved = bytearray(num_targets * width)
+        for (i, total) in enumerate(totals):
+            interleaved[i::width] = total.to_bytes(num_targets, 'little')
+        row = array.array(self.typecode, bytes(interleaved))
+        if sys.byteorder == 'big':
+            row.byteswap()
+        return row
+
+    def map_file(self, directory):
+        """Reads and writes the rows in a file of the whole matrix in
+        directory, mapped into memory once the first row is needed. The file
+        starts out empty, with a byte per row set once the row is written, so
+        each row is computed only by the first process to need it. Only
+        matrices small enough to cache are mapped."""
+        if self.cache_rows:
+            self._file_dir = directory
+
+    def _map(self):
+        filename = os.path.join(self._file_dir, matrix_filename(self))
+        self._file_dir = None
+        num_guesses = len(self.guess_words)
+        # the rows start aligned to the widest code
+        header = -(-num_guesses // 8) * 8
+        size = header + num_guesses * len(self.target_words) * self.code_width()
+        if size == header:
+            return
+        if not os.path.exists(filename):
+            logger.info('creating feedback matrix %s', filename)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            # several processes may be creating it at once
+            tmp_filename = f'{filename}.{os.getpid()}.tmp'
+            with open(tmp_filename, 'wb') as outfile:
+                outfile.truncate(size)
+            try:
+                os.link(tmp_filename, filename)
+            except FileExistsError:
+                pass
+            os.remove(tmp_filename)
+        logger.info('mapping feedback matrix %s', filename)
+        with open(filename, 'r+b') as infile:
+            mapped = memoryview(mmap.mmap(infile.fileno(), size, access=mmap.ACCESS_WRITE))
+        self._written = mapped[:num_guesses]
+        self._mapped = mapped[header:] if self.typecode is None else mapped[header:].cast(self.typecode)
+        self._rows = {}
+
+    def row(self, guess_id):
+        if self._file_dir is not None:
+            self._map()
+        if self._mapped is not None:
+            num_targets = len(self.target_words)
+            row = self._mapped[guess_id * num_targets:(guess_id + 1) * num_targets]
+            if not self._written[guess_id]:
+                row[:] = self._compute_row(self.guess_words[guess_id])
+                self._written[guess_id] = 1
+            return row
+        if guess_id in self._rows:
+            return self._rows[guess_id]
+        row = self._compute_row(self.guess_words[guess_id])
+        if self.cache_rows:
+            self._rows[guess_id] = row
+        return row
+
+    def row_for_word(self, word):
+        if word in self.guess_index:
+            return self.row(self.guess_index[word])
+        return self._compute_row(word)
+
+    def picker(self, target_ids):
+        """Returns a function taking a row to the codes of only the given
+        target ids. None stands for every target."""
+        if target_ids is None:
+            return lambda row: row
+        if len(target_ids) == 1:
+            target_id = target_ids[0]
+            return lambda row: self.pack([row[target_id]])
+        getter = operator.itemgetter(*target_ids)
+        return lambda row: self.pack(getter(row))
+
+    def restrict(self, row, target_ids):
+        """Returns the codes of row for only the given target ids."""
+        return self.picker(target_ids)(row)
+
+    def partition(self, guess_id, target_ids=None):
+        """Returns a Counter of feedback code to number of targets. Counting
+        is sparse, so it does not grow with the 3**word_length possible
+        codes."""
+        return collections.Counter(self.restrict(self.row(guess_id), target_ids))
+
+def partition_score(counts, metric):
+    """Scores a partition of the candidates, higher is better."""
+    total = sum(counts.values())
+    if metric == 'entropy':
+        return math.log2(total) - sum(n * math.log2(n) for n in counts.values()) / total
+    elif metric == 'expected':
+        return -sum(n * n for n in counts.values()) / total
+    elif metric == 'minimax':
+        return -max(counts.values())
+    raise ValueError(f'unknown partition metric {metric}')
+
+def matrix_filename(fm):
+    """Feedback matrix files are specific to the guess and target pools, and
+    to the byte order of the codes."""
+    digest = hashlib.sha1()
+    digest.update(bytes('\n'.join(fm.target_words), 'utf-8'))
+    digest.update(b'|')
+    digest.update(bytes('\n'.join(fm.guess_words), 'utf-8'))
+    return f'{fm.word_length}_letter_rows_{sys.byteorder}_{digest.hexdigest()[:12]}.bin'
+
+def opening_book_filename(fm, metric):
+    """Opening books are specific to the metric, and the guess and target
+    pools, which are identified by a digest of their words."""
+    digest = hashlib.sha1()
+    digest.update(bytes('\n'.join(fm.target_words), 'utf-8'))
+    digest.update(b'|')
+    digest.update(bytes('\n'.join(fm.guess_words), 'utf-8'))
+    return f'{fm.word_length}_letter_{metric}_{digest.hexdigest()[:12]}.txt'
+
 class GameState:
-    def __init__(self, word_length, dictionaries):
+    def __init__(self, word_length, dictionaries, guess_dictionaries=None, feedback_matrix=None, opening_book_dir=None):
         self.word_length = word_length
         self.dictionaries = dictionaries
+        self.guess_dictionaries = guess_dictionaries if guess_dictionaries is not None else []
+        self.opening_book_dir = opening_book_dir
+        self._matrix = feedback_matrix
+        self._opening_scores = {}
         self.reset()
 
+    def copy(self):
+        """A new game of the same dictionaries, sharing this one's feedback
+        matrix and opening scores."""
+        state = GameState(self.word_length, self.dictionaries, self.guess_dictionaries, self.feedback_matrix(), self.opening_book_dir)
+        state._opening_scores = self._opening_scores
+        return state
+
     def reset(self):
         self.contains = set()
         self.does_not_contain = set()
@@ -74,6 +453,45 @@ class GameState:
         for i in range(self.word_length):
             self.bad_positions[i] = set()
         self.good_positions = [None] * self.word_length
+        self.history = []
+        self.target_ids = None
+        self._applied_history = 0
+        self.hard_mode_bits = None
+        self._applied_hard_mode_history = 0
+
+    def feedback_matrix(self):
+        """The guess pool is every word of the guess and target dictionaries,
+        the target pool only the words of the target dictionaries."""
+        if self._matrix is None:
+            target_words = dict.fromkeys(w for d in self.dictionaries for w in d.words)
+            guess_words = dict(target_words)
+            guess_words.update(dict.fromkeys(w for d in self.guess_dictionaries for w in d.words))
+            self._matrix = FeedbackMatrix(guess_words.keys(), target_words.keys())
+            if self.opening_book_dir is not None:
+                self._matrix.map_file(self.opening_book_dir)
+        return self._matrix
+
+    def target_candidates(self):
+        """Ids of the targets consistent with every guess so far."""
+        fm = self.feedback_matrix()
+        if self.target_ids is None:
+            self.target_ids = list(range(len(fm.target_words)))
+        for (word, code) in self.history[self._applied_history:]:
+            row = fm.row_for_word(word)
+            self.target_ids = [t for t in self.target_ids if row[t] == code]
+        self._applied_history = len(self.history)
+        return self.target_ids
+
+    def hard_mode_guesses(self):
+        """Ids of the guess pool words that hard mode still allows. Only the
+        guesses since the last call are applied to the allowed bitset."""
+        fm = self.feedback_matrix()
+        if self.hard_mode_bits is None:
+            self.hard_mode_bits = fm.all_guesses()
+        for (word, code) in self.history[self._applied_hard_mode_history:]:
+            self.hard_mode_bits &= fm.hard_mode_guesses(word, code)
+        self._applied_hard_mode_history = len(self.history)
+        return bitset_ids(self.hard_mode_bits)
 
     def parse_line(self, line):
         last_letter = None
@@ -107,6 +525,10 @@ class GameState:
         if not read_special and last_letter is not None and last_letter not in self.contains:
             self.does_not_contain.add(last_letter)
 
+        (word, code) = parse_feedback(line)
+        if len(word) == self.word_length:
+            self.history.append((word, code))
+
     def _letter_freqs(self, candidates, NGRAM_LENGTH, USE_POS_FREQ, SCORE_ONLY_UNUSED_LETTERS):
         # build unigram, bigram, and position frequencies
         used_letters = set()
@@ -374,7 +796,8 @@ class GameState:
         scores = {}
         candidates = list(range(len(d.words)))
         if not IGNORE_FEEDBACK:
-            candidates = list(d.search(self.word_length, self.contains, self.does_not_contain, self._make_regexp()))
+            # in id order, as the order of the search depends on string hashing
+            candidates = sorted(d.search(self.word_length, self.contains, self.does_not_contain, self._make_regexp()))
             logger.debug('_sgr took feedback and got %d candidates', len(candidates))
         else:
             logger.debug('_sgr ignored feedback and got %d candidates', len(candidates))
@@ -400,12 +823,83 @@ class GameState:
 
         return sorted(scores.items(), key=lambda p: p[1], reverse=True)
 
+    def _load_opening_book(self, fm, metric):
+        if self.opening_book_dir is None:
+            return None
+        filename = os.path.join(self.opening_book_dir, opening_book_filename(fm, metric))
+        if not os.path.exists(filename):
+            return None
+        logger.info('loading opening book %s', filename)
+        scored = []
+        with open(filename, 'r') as infile:
+            for line in infile.read().split("\n"):
+                if len(line) > 0:
+                    (word, score) = line.split(' ')
+                    scored.append((word, float(score)))
+        return scored
+
+    def _save_opening_book(self, fm, metric, scored):
+        if self.opening_book_dir is None:
+            return
+        os.makedirs(self.opening_book_dir, exist_ok=True)
+        filename = os.path.join(self.opening_book_dir, opening_book_filename(fm, metric))
+        logger.info('saving opening book %s', filename)
+        with open(filename + '.tmp', 'w') as outfile:
+            for (word, score) in scored:
+                outfile.write(f'{word} {score!r}\n')
+        os.replace(filename + '.tmp', filename)
+
+    def _single_guess_partition(self, fm, **kwargs):
+        """Scores every word of the guess pool by how it partitions the
+        remaining target candidates, breaking ties in favor of candidates.
+        In hard mode only the words using every revealed hint are scored.
+
+        The opening is the same every game, so it is only scored once, and
+        kept in the opening book if there is one."""
+        METRIC = kwargs.get('metric', 'entropy')
+        HARD_MODE = kwargs.get('hard', False)
+        if len(self.history) == 0:
+            if self._opening_scores.get(METRIC) is None:
+                self._opening_scores[METRIC] = self._load_opening_book(fm, METRIC)
+            if self._opening_scores[METRIC] is not None:
+                return self._opening_scores[METRIC]
+
+        target_ids = self.target_candidates()
+        guess_ids = range(len(fm.guess_words))
+        if HARD_MODE:
+            guess_ids = self.hard_mode_guesses()
+        logger.debug('_sgp %d target candidates %d guesses', len(target_ids), len(guess_ids))
+        if len(target_ids) == 0:
+            return []
+        candidate_words = set(map(lambda t: fm.target_words[t], target_ids))
+        scoring = fm
+        scoring_ids = target_ids
+        if len(target_ids) == len(fm.target_words):
+            scoring_ids = None
+        elif not fm.cache_rows:
+            # rows are not cached, so only compute them for the candidates
+            scoring = fm.subset(target_ids)
+            scoring_ids = None
+        scores = {}
+        for guess_id in guess_ids:
+            word = fm.guess_words[guess_id]
+            scores[word] = partition_score(scoring.partition(guess_id, scoring_ids), METRIC)
+            if word in candidate_words:
+                scores[word] += 1e-6
+        scored = sorted(scores.items(), key=lambda p: p[1], reverse=True)
+
+        if len(self.history) == 0:
+            self._opening_scores[METRIC] = scored
+            self._save_opening_book(fm, METRIC, scored)
+        return scored
+
     def guess(self, return_scores=False, **kwargs):
         logger.debug('STATE: wl %d, contains %s, dnc %s, regexp %s', self.word_length, self.contains, self.does_not_contain, self._make_regexp().pattern)
         GUESS_LAMBDA = kwargs.get('glam', lambda d: self._single_guess_heuristics(d))
         NORMALIZE_SCORES = kwargs.get('normalize', True)
+        DICTIONARIES = kwargs.get('dictionaries', self.dictionaries)
         new_scores = {}
-        for d in self.dictionaries:
+        for d in DICTIONARIES:
             guesses = GUESS_LAMBDA(d)
             norm = sum(map(lambda p: p[1], guesses))
             if norm == 0:
@@ -441,33 +935,289 @@ class GameState:
                 r += '.'
         return re.compile(r)
 
+class MultiBoardState(GameState):
+    """State of a game played on several boards at once (Dordle, Quordle,
+    ...), where every guess is played on every board.
+
+    Feedback lines hold one comma separated field per board, either the usual
+    feedback or `CORRECT` once that board has been solved. Only the partition
+    strategies are supported."""
+
+    def __init__(self, word_length, dictionaries, guess_dictionaries=None, num_boards=2, opening_book_dir=None, feedback_matrix=None):
+        self.boards = []
+        super().__init__(word_length, dictionaries, guess_dictionaries, feedback_matrix, opening_book_dir)
+        for i in range(num_boards):
+            self.boards.append(GameState(word_length, dictionaries, guess_dictionaries, self.feedback_matrix(), opening_book_dir))
+        self.reset()
+
+    def copy(self):
+        state = MultiBoardState(self.word_length, self.dictionaries, self.guess_dictionaries, len(self.boards), self.opening_book_dir, self.feedback_matrix())
+        state.boards[0]._opening_scores = self.boards[0]._opening_scores
+        return state
+
+    def reset(self):
+        super().reset()
+        for board in self.boards:
+            board.reset()
+        self.solved = [False] * len(self.boards)
+
+    def parse_line(self, line):
+        fields = line.split(',')
+        if len(fields) != len(self.boards):
+            return
+        for (i, field) in enumerate(fields):
+            if field.strip() == 'CORRECT':
+                self.solved[i] = True
+            elif not self.solved[i]:
+                self.boards[i].parse_line(field)
+
+    def hard_mode_guesses(self):
+        allowed = self.feedback_matrix().all_guesses()
+        for (board, solved) in zip(self.boards, self.solved):
+            if not solved:
+                board.hard_mode_guesses()
+                allowed &= board.hard_mode_bits
+        return bitset_ids(allowed)
+
+    def _single_guess_partition(self, fm, **kwargs):
+        """Scores every word of the guess pool by the sum of its partition
+        scores over the unsolved boards. A board down to a single candidate is
+        solved first.
+
+        The candidates of every board are gathered from a row with a single
+        itemgetter call, and then sliced per board."""
+        METRIC = kwargs.get('metric', 'entropy')
+        HARD_MODE = kwargs.get('hard', False)
+        unsolved = [board for (board, solved) in zip(self.boards, self.solved) if not solved]
+        if all(len(board.history) == 0 for board in unsolved):
+            # every board is identical, so is the ranking
+            return self.boards[0]._single_guess_partition(fm, **kwargs)
+
+        candidate_sets = [board.target_candidates() for board in unsolved]
+        candidate_sets = [ids for ids in candidate_sets if len(ids) > 0]
+        forced = [(fm.target_words[ids[0]], float('inf')) for ids in candidate_sets if len(ids) == 1]
+        if len(forced) > 0 or len(candidate_sets) == 0:
+            return forced
+
+        all_ids = []
+        bounds = []
+        candidate_words = {}
+        for ids in candidate_sets:
+            bounds.append((len(all_ids), len(all_ids) + len(ids)))
+            all_ids += ids
+            for t in ids:
+                word = fm.target_words[t]
+                candidate_words[word] = candidate_words.get(word, 0) + 1
+        scoring = fm
+        pick = fm.picker(all_ids)
+        if not fm.cache_rows:
+            # rows are not cached, so only compute them for the candidates
+            scoring = fm.subset(all_ids)
+            pick = scoring.picker(None)
+
+        guess_ids = range(len(fm.guess_words))
+        if HARD_MODE:
+            guess_ids = self.hard_mode_guesses()
+        logger.debug('_mbsgp %s target candidates %d guesses', list(map(len, candidate_sets)), len(guess_ids))
+        scores = {}
+        for guess_id in guess_ids:
+            codes = pick(scoring.row(guess_id))
+            score = 0
+            for (start, end) in bounds:
+                score += partition_score(collections.Counter(codes[start:end]), METRIC)
+            word = fm.guess_words[guess_id]
+            scores[word] = score + 1e-6 * candidate_words.get(word, 0)
+        return sorted(scores.items(), key=lambda p: p[1], reverse=True)
+
+def remove_stale_socket(path):
+    """Removes the Unix domain socket at path left behind by a server that
+    did not exit cleanly."""
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.remove(path)
+
+def fork_server(path):
+    """Listens on the Unix domain socket path, and forks a child for every
+    connection, which returns with the connection as its stdin and stdout.
+    The parent never returns. The children share whatever the parent loaded
+    before calling, copy on write."""
+    remove_stale_socket(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    # the children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    logger.info('forking solvers on %s', path)
+    try:
+        while True:
+            (conn, _) = server.accept()
+            if os.fork() == 0:
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                server.close()
+                os.dup2(conn.fileno(), 0)
+                os.dup2(conn.fileno(), 1)
+                conn.close()
+                sys.stdin = open(0, 'r', closefd=False)
+                sys.stdout = open(1, 'w', closefd=False)
+                return
+            conn.close()
+    except KeyboardInterrupt:
+        os.remove(path)
+        sys.exit(0)
+
+class SolverServer:
+    """Serves independent games, each a session with a player of pool, to
+    clients of a socket. Requests and responses are single lines:
+
+        NEW                     -> OK <session>
+        GUESS <session> [k]     -> OK <the k (default 1) best guesses>
+        FEEDBACK <session> <feedback line, as on stdin>
+                                -> OK
+        INVALID <session>       -> OK, the best guess was not a valid word
+        END <session>           -> OK, and the session is forgotten
+
+    or ERROR <reason>. Sessions do not belong to connections, so clients may
+    pool their connections. A session not used for idle_timeout seconds is
+    ended, when the next NEW request arrives, so clients that never send END
+    do not keep their players forever; None keeps every session until END.
+
+    GUESS and INVALID, which may score the guesses, run on a thread pool, so
+    a slow guess does not hold up the requests of other sessions. They still
+    share one CPU through the GIL; for more, run a server per CPU, or use
+    --fork_server. The requests of a session are handled one at a time."""
+
+    def __init__(self, pool, idle_timeout=None):
+        self.pool = pool
+        self.idle_timeout = idle_timeout
+        # the (player, lock) of every session
+        self.sessions = {}
+        # the time.monotonic() of the last request of every session
+        self.last_used = {}
+        self.next_id = 0
+
+    def expire_sessions(self):
+        """Ends the sessions idle for longer than idle_timeout, except those
+        with a request in progress."""
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic()
+        for (session, (player, lock)) in list(self.sessions.items()):
+            if now - self.last_used[session] > self.idle_timeout and not lock.locked():
+                logger.info('session %s expired', session)
+                del self.sessions[session]
+                del self.last_used[session]
+                self.pool.release(player)
+
+    async def handle(self, request):
+        fields = request.split(' ', 2)
+        command = fields[0].upper()
+        if command == 'NEW':
+            self.expire_sessions()
+            self.next_id += 1
+            self.sessions[str(self.next_id)] = (self.pool.acquire(), asyncio.Lock())
+            self.last_used[str(self.next_id)] = time.monotonic()
+            return f'OK {self.next_id}'
+        if command not in ('GUESS', 'FEEDBACK', 'INVALID', 'END'):
+            return f'ERROR bad request {command}'
+        if len(fields) < 2 or fields[1] not in self.sessions:
+            return 'ERROR unknown session'
+        (player, lock) = self.sessions[fields[1]]
+        self.last_used[fields[1]] = time.monotonic()
+        async with lock:
+            if fields[1] not in self.sessions:
+                return 'ERROR unknown session'
+            if command == 'GUESS':
+                k = 1
+                if len(fields) > 2:
+                    if not fields[2].isdigit():
+                        return 'ERROR k must be a number'
+                    k = int(fields[2])
+                guesses = await asyncio.get_running_loop().run_in_executor(None, player.top_guesses, k)
+                return ' '.join(['OK'] + guesses)
+            elif command == 'FEEDBACK':
+                if len(fields) < 3:
+                    return 'ERROR missing feedback'
+                state = player.game_state
+                error = feedback_line_error(fields[2], state.word_length, len(state.boards) if isinstance(state, MultiBoardState) else 1)
+                if error is not None:
+                    return f'ERROR {error}'
+                player.observe_line(fields[2])
+            elif command == 'INVALID':
+                await asyncio.get_running_loop().run_in_executor(None, player.next_guess)
+                player.observe(None)
+            else:
+                del self.last_used[fields[1]]
+                self.pool.release(self.sessions.pop(fields[1])[0])
+        return 'OK'
+
+    async def serve_client(self, reader, writer):
+        while True:
+            request = await reader.readline()
+            if len(request) == 0:
+                break
+            try:
+                response = await self.handle(request.decode('utf-8').strip())
+            except Exception as e:
+                logger.exception('request %s failed', request)
+                response = f'ERROR {type(e).__name__}'
+            writer.write(bytes(response + '\n', 'utf-8'))
+            await writer.drain()
+        writer.close()
+
+    async def serve(self, address):
+        """Listens on address, host:port for TCP or else the path of a Unix
+        domain socket, until cancelled."""
+        if ':' in address:
+            (host, port) = address.rsplit(':', 1)
+            server = await asyncio.start_server(self.serve_client, host, int(port))
+        else:
+            remove_stale_socket(address)
+            server = await asyncio.start_unix_server(self.serve_client, address)
+        logger.info('serving on %s', address)
+        async with server:
+            await server.serve_forever()
+
 ##############################################################################
-if __name__ == '__main__':
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description='Wordle solver')
     parser.add_argument('word_length', type=int, default=5, nargs='?', help='length of word')
     parser.add_argument('--game', action='store_true', default=False)
+    parser.add_argument('--offer_protocol_2', action='store_true', default=False, help='With --game, start by offering the multiplexed protocol 2 as a first guess of PROTOCOL 2, which the host accepts by echoing it or declines with INVALID WORD')
     parser.add_argument('--debug', action='store_true', default=False)
     parser.add_argument('--verbose', action='store_true', default=False)
     parser.add_argument('--strategy', type=int, default=0, help='ID of guessing strategy')
     parser.add_argument('--dictionary_dir', type=str, default='./dicts', help='Directory containing dictionaries')
     parser.add_argument('--dictionaries', type=str, default='5_letter_wordle_targets.txt', help='CSV of dictionary files to load')
-    args = parser.parse_args()
-
-    if args.verbose:
-        logger.setLevel(logging.INFO)
-    if args.debug:
-        logger.setLevel(logging.DEBUG)
-
-    dictionaries = []
-    for filename in args.dictionaries.split(','):
-        filename = os.path.join(args.dictionary_dir, filename.strip())
-        dictionaries.append(Dictionary(filename, args.word_length))
-
-    if (not args.game):
-        print('loading...', list(map(lambda d: d.filename, dictionaries)))
-    game_state = GameState(args.word_length, dictionaries)
-
-    strategies = [
+    parser.add_argument('--target_dictionaries', type=str, default=None, help='CSV of dictionary files of possible answers. Defaults to --dictionaries')
+    parser.add_argument('--guess_dictionaries', type=str, default=None, help='CSV of dictionary files of additional words that may be guessed')
+    parser.add_argument('--boards', type=int, default=1, help='Number of boards played simultaneously')
+    parser.add_argument('--opening_book_dir', type=str, default=None, help='Directory in which to cache the opening guesses and feedback matrices of the partition strategies, shared by every run given it (default: no cache)')
+    parser.add_argument('--serve', type=str, default=None, help='Serve games on a socket, host:port for TCP or else the path of a Unix domain socket')
+    parser.add_argument('--idle_timeout', type=float, default=600, help='Seconds after which a --serve session with no requests is ended (default: 600)')
+    parser.add_argument('--fork_server', type=str, default=None, help='Path of a Unix domain socket on which to fork a --game solver for every connection, for wordle.py --exec unix:PATH')
+    args = parser.parse_args(argv)
+    if args.target_dictionaries is None:
+        args.target_dictionaries = args.dictionaries
+    return args
+
+def make_game_state(args):
+    def load_dictionaries(csv):
+        loaded = []
+        if csv is not None:
+            for filename in csv.split(','):
+                filename = os.path.join(args.dictionary_dir, filename.strip())
+                loaded.append(Dictionary(filename, args.word_length))
+        return loaded
+
+    dictionaries = load_dictionaries(args.target_dictionaries)
+    guess_dictionaries = load_dictionaries(args.guess_dictionaries)
+    if args.boards > 1:
+        return MultiBoardState(args.word_length, dictionaries, guess_dictionaries, args.boards, args.opening_book_dir)
+    return GameState(args.word_length, dictionaries, guess_dictionaries, opening_book_dir=args.opening_book_dir)
+
+def make_strategies(game_state):
+    """The guessing strategies of game_state, indexed by --strategy. Each
+    returns the guesses ranked best first."""
+    return [
         # 0
         lambda: game_state.guess(normalize=True, glam=lambda d: game_state._single_guess_heuristics(d, ngrams=2, pos_freq=True)),    # 0.log:Number of attempts to win: mean: 4.430554 stddev: 63.349
         lambda: game_state.guess(normalize=True, glam=lambda d: game_state._single_guess_heuristics(d, ngrams=2, pos_freq=False)),   # 1.log:Number of attempts to win: mean: 4.422290 stddev: 63.482
@@ -526,9 +1276,182 @@ if __name__ == '__main__':
         # 34
         lambda: game_state.guess(normalize=False, glam=lambda d: game_state._single_guess_heuristics(d, ngrams=1, pos_freq=True, score_only_unused=False)),
         lambda: game_state.guess(normalize=False, glam=lambda d: game_state._single_guess_heuristics(d, ngrams=2, pos_freq=True, score_only_unused=False)),
+
+        # 36 score the guess pool by how it partitions the target candidates
+        lambda: game_state.guess(normalize=False, dictionaries=[game_state.feedback_matrix()], glam=lambda fm: game_state._single_guess_partition(fm, metric='entropy')),
+        lambda: game_state.guess(normalize=False, dictionaries=[game_state.feedback_matrix()], glam=lambda fm: game_state._single_guess_partition(fm, metric='expected')),
+        lambda: game_state.guess(normalize=False, dictionaries=[game_state.feedback_matrix()], glam=lambda fm: game_state._single_guess_partition(fm, metric='minimax')),
+
+        # 39 hard mode versions of 36 to 38
+        lambda: game_state.guess(normalize=False, dictionaries=[game_state.feedback_matrix()], glam=lambda fm: game_state._single_guess_partition(fm, metric='entropy', hard=True)),
+        lambda: game_state.guess(normalize=False, dictionaries=[game_state.feedback_matrix()], glam=lambda fm: game_state._single_guess_partition(fm, metric='expected', hard=True)),
+        lambda: game_state.guess(normalize=False, dictionaries=[game_state.feedback_matrix()], glam=lambda fm: game_state._single_guess_partition(fm, metric='minimax', hard=True)),
     ]
-    if args.strategy >= len(strategies):
-        args.strategy = 0
+
+def strategy_id(args, num_strategies):
+    strategy = args.strategy
+    if strategy >= num_strategies:
+        strategy = 0
+    if args.boards > 1 and strategy < 36:
+        # only the partition strategies understand multiple boards
+        strategy = 36
+    return strategy
+
+class SolverPlayer:
+    """Plays in process the games that `solver.py --game` plays over stdin
+    and stdout. reset() starts a game, next_guess() returns the next guess,
+    or None when out of guesses, and observe() takes the feedback code of
+    that guess, or None if it was not a valid word. With several boards the
+    feedback is a list with one code per board, None once a board is
+    solved. restore() goes back to a history of a single board game."""
+
+    def __init__(self, game_state, strategy):
+        self.game_state = game_state
+        self.strategy = strategy
+        self.reset()
+
+    def reset(self):
+        self.game_state.reset()
+        self.guesses = None
+        self.rejected = 0
+
+    def next_guess(self):
+        if self.guesses is None:
+            self.guesses = self.strategy()
+            self.rejected = 0
+        if self.rejected >= len(self.guesses):
+            return None
+        return self.guesses[self.rejected]
+
+    def top_guesses(self, k):
+        """The k best guesses not yet rejected."""
+        self.next_guess()
+        return self.guesses[self.rejected:self.rejected + k]
+
+    def observe(self, code):
+        if code is None:
+            self.rejected += 1
+            return
+        word = self.guesses[self.rejected]
+        if isinstance(code, list):
+            self.observe_line(','.join('CORRECT' if c is None else format_feedback(word, c) for c in code))
+        else:
+            self.observe_line(format_feedback(word, code))
+
+    def observe_line(self, line):
+        """observe() of a feedback line of the text protocol."""
+        self.game_state.parse_line(line)
+        self.guesses = None
+
+    def restore(self, history):
+        """Starts a game over at the (guess, code) pairs of history."""
+        self.reset()
+        for (guess, code) in history:
+            self.observe_line(format_feedback(guess, code))
+
+class PlayerPool:
+    """SolverPlayers of copies of one game state, so they share its
+    dictionaries and feedback matrix, kept for reuse once their game is
+    over."""
+
+    def __init__(self, game_state, strategy):
+        self.game_state = game_state
+        self.strategy = strategy
+        self.free = []
+
+    def acquire(self):
+        if len(self.free) > 0:
+            player = self.free.pop()
+            player.reset()
+            return player
+        state = self.game_state.copy()
+        return SolverPlayer(state, make_strategies(state)[self.strategy])
+
+    def release(self, player):
+        self.free.append(player)
+
+PROTOCOL_2 = 'PROTOCOL 2'
+
+def read_line_batches(stream):
+    """Yields the lines of a binary stream as a list of every complete line
+    available at each read, so they can be answered in one write."""
+    pending = b''
+    while True:
+        data = stream.read1(1 << 16)
+        if len(data) == 0:
+            return
+        lines = (pending + data).split(b'\n')
+        pending = lines.pop()
+        if len(lines) > 0:
+            yield [line.decode('utf-8').strip() for line in lines]
+
+def serve_multiplexed(pool, in_stream, out_stream):
+    """Plays protocol 2, where every line is prefixed by the id of its game
+    and a process plays many games at once. The host starts a game with
+    `<id> NEW`, then answers each `<id> <guess>` as in the text protocol.
+    A game ends with `<id> CORRECT`, `<id> YOU LOSE`, or the player's
+    `<id> OUT OF GUESSES`. Every answer to a batch of lines is written at
+    once."""
+    players = {}
+    for lines in read_line_batches(in_stream):
+        out = []
+        for line in lines:
+            if len(line) == 0:
+                continue
+            (game_id, message) = (line.split(' ', 1) + [''])[:2]
+            if message == 'NEW':
+                players[game_id] = pool.acquire()
+            elif message == 'CORRECT' or message == 'YOU LOSE':
+                pool.release(players.pop(game_id))
+                continue
+            elif message == 'INVALID WORD':
+                players[game_id].observe(None)
+            else:
+                players[game_id].observe_line(message)
+            guess = players[game_id].next_guess()
+            if guess is None:
+                out.append(f'{game_id} OUT OF GUESSES\n')
+                pool.release(players.pop(game_id))
+            else:
+                out.append(f'{game_id} {guess}\n')
+        out_stream.write(bytes(''.join(out), 'utf-8'))
+        out_stream.flush()
+
+def make_player(argv):
+    """SolverPlayer of the `solver.py` command line arguments argv."""
+    args = parse_args(argv)
+    game_state = make_game_state(args)
+    strategies = make_strategies(game_state)
+    return SolverPlayer(game_state, strategies[strategy_id(args, len(strategies))])
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.INFO)
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+
+    game_state = make_game_state(args)
+    if (not args.game):
+        print('loading...', list(map(lambda d: d.filename, game_state.dictionaries + game_state.guess_dictionaries)))
+
+    strategies = make_strategies(game_state)
+    args.strategy = strategy_id(args, len(strategies))
+
+    if args.serve is not None:
+        try:
+            asyncio.run(SolverServer(PlayerPool(game_state, args.strategy), args.idle_timeout).serve(args.serve))
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    if args.fork_server is not None:
+        # the first guess builds or loads everything the strategy caches
+        strategies[args.strategy]()
+        game_state.reset()
+        fork_server(args.fork_server)
+        args.game = True
 
     if (not args.game):
         print('Using strategy', args.strategy)
@@ -541,6 +1464,12 @@ if __name__ == '__main__':
         print()
     else:
         logger.info('Using strategy %d', args.strategy)
+    if args.game and args.offer_protocol_2:
+        # a host that does not know protocol 2 rejects it as an invalid word
+        print(PROTOCOL_2, flush=True)
+        if sys.stdin.buffer.readline().decode('utf-8').strip() == PROTOCOL_2:
+            serve_multiplexed(PlayerPool(game_state, args.strategy), sys.stdin.buffer, sys.stdout.buffer)
+            sys.exit(0)
 
     line = ''
     while True:
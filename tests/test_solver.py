@@ -0,0 +1,195 @@
+import asyncio
+import collections
+import os.path
+import random
+import time
+
+import pytest
+
+import solver
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def in_root(monkeypatch):
+    monkeypatch.chdir(root)
+
+
+def make_server(argv):
+    args = solver.parse_args(argv)
+    game_state = solver.make_game_state(args)
+    strategy = solver.strategy_id(args, len(solver.make_strategies(game_state)))
+    return solver.SolverServer(solver.PlayerPool(game_state, strategy), args.idle_timeout)
+
+
+def test_feedback_line_error():
+    assert solver.feedback_line_error('a?rose*', 5) is None
+    assert solver.feedback_line_error('a? r o s e*', 5) is None
+    assert solver.feedback_line_error('CORRECT,a?rose*', 5, 2) is None
+    assert solver.feedback_line_error('abcdefgh*', 5) is not None
+    assert solver.feedback_line_error('a?r*?ose', 5) is not None
+    assert solver.feedback_line_error('?arose', 5) is not None
+    assert solver.feedback_line_error('CORRECT', 5) is not None
+    assert solver.feedback_line_error('a?rose*', 5, 2) is not None
+
+
+def test_server_rejects_bad_requests():
+    server = make_server(['--strategy', '3'])
+
+    async def session():
+        assert await server.handle('NEW') == 'OK 1'
+        first = await server.handle('GUESS 1 3')
+        assert first.startswith('OK ') and len(first.split()) == 4
+        assert (await server.handle('FEEDBACK 1 abcdefgh*')).startswith('ERROR')
+        assert (await server.handle('FEEDBACK 1')).startswith('ERROR')
+        assert await server.handle('FEEDBACK 2 a?rose*') == 'ERROR unknown session'
+        assert await server.handle('GUESS x') == 'ERROR unknown session'
+        assert (await server.handle('GUESS 1 many')).startswith('ERROR')
+        assert (await server.handle('PLAY 1')).startswith('ERROR')
+        # the bad feedback left the session as it was
+        assert await server.handle('GUESS 1 3') == first
+        assert await server.handle('FEEDBACK 1 a?rose*') == 'OK'
+        assert await server.handle('GUESS 1 3') != first
+        assert await server.handle('END 1') == 'OK'
+        assert await server.handle('END 1') == 'ERROR unknown session'
+
+    asyncio.run(session())
+
+
+def test_server_guesses_off_the_event_loop():
+    server = make_server(['--strategy', '3'])
+    finished = []
+
+    async def slow_session():
+        await server.handle('NEW')
+        (player, lock) = server.sessions['1']
+        player.top_guesses = lambda k: time.sleep(0.5) or ['later']
+        assert await server.handle('GUESS 1') == 'OK later'
+        finished.append('slow')
+
+    async def fast_session():
+        await asyncio.sleep(0.1)
+        assert await server.handle('NEW') == 'OK 2'
+        assert (await server.handle('GUESS 2')).startswith('OK ')
+        finished.append('fast')
+
+    async def both():
+        await asyncio.gather(slow_session(), fast_session())
+
+    asyncio.run(both())
+    assert finished == ['fast', 'slow']
+
+
+def test_server_expires_idle_sessions():
+    server = make_server(['--strategy', '3', '--idle_timeout', '60'])
+
+    async def sessions():
+        assert await server.handle('NEW') == 'OK 1'
+        assert await server.handle('NEW') == 'OK 2'
+        (expired, lock) = server.sessions['1']
+        server.last_used['1'] -= 120
+        assert await server.handle('NEW') == 'OK 3'
+        assert await server.handle('GUESS 1') == 'ERROR unknown session'
+        assert (await server.handle('GUESS 2')).startswith('OK ')
+        assert sorted(server.sessions) == ['2', '3']
+        # the player of the expired session went back to the pool
+        assert server.sessions['3'][0] is expired
+
+    asyncio.run(sessions())
+
+
+@pytest.mark.parametrize('length', [5, 7])
+def test_mapped_matrix_rows_are_written_on_demand(tmp_path, length):
+    words = ['arose', 'nasty', 'tonal', 'eerie', 'sassy'] if length == 5 else ['example', 'letters', 'minimum', 'teeters']
+    fm = solver.FeedbackMatrix(words, words)
+    fm.map_file(str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
+    assert list(fm.row(1)) == list(fm._compute_row(words[1]))
+    (filename,) = tmp_path.iterdir()
+    assert list(fm._written) == [0, 1] + [0] * (len(words) - 2)
+
+    other = solver.FeedbackMatrix(words, words)
+    other.map_file(str(tmp_path))
+    for (guess_id, word) in enumerate(words):
+        assert list(other.row(guess_id)) == list(fm._compute_row(word))
+    assert list(fm._written) == [1] * len(words)
+    assert list(tmp_path.iterdir()) == [filename]
+
+
+def test_opening_books_are_opt_in():
+    assert solver.parse_args([]).opening_book_dir is None
+
+
+def test_feedback_code_of_repeated_letters():
+    assert solver.format_feedback('speed', solver.feedback_code('speed', 'abide')) == 'spe?ed?'
+    assert solver.format_feedback('lolly', solver.feedback_code('lolly', 'hello')) == 'lo?l*l*y'
+    assert solver.format_feedback('eerie', solver.feedback_code('eerie', 'eerie')) == 'e*e*r*i*e*'
+
+
+def random_words(rng, length, count):
+    # few letters, so most words repeat some
+    return [''.join(rng.choice('aabcde') for _ in range(length)) for _ in range(count)]
+
+
+@pytest.mark.parametrize('length', [1, 5, 6, 10, 12])
+def test_matrix_rows_match_feedback_code(length):
+    rng = random.Random(length)
+    targets = list(dict.fromkeys(random_words(rng, length, 60)))
+    guesses = list(dict.fromkeys(targets[:10] + random_words(rng, length, 40) + ['a' * length]))
+    fm = solver.FeedbackMatrix(guesses, targets)
+    for (guess_id, guess) in enumerate(guesses):
+        assert list(fm.row(guess_id)) == [solver.feedback_code(guess, target) for target in targets]
+
+
+def make_game_state(tmp_path, words, boards=1):
+    filename = tmp_path / 'words.txt'
+    filename.write_text('\n'.join(words))
+    dictionaries = [solver.Dictionary(str(filename), len(words[0]))]
+    if boards > 1:
+        return solver.MultiBoardState(len(words[0]), dictionaries, num_boards=boards)
+    return solver.GameState(len(words[0]), dictionaries)
+
+
+@pytest.mark.parametrize('metric', ['entropy', 'expected', 'minimax'])
+def test_partition_scores_candidates(tmp_path, metric):
+    words = ['arose', 'nasty', 'tonal', 'eerie', 'sassy', 'tease', 'stone', 'onset', 'notes', 'loser']
+    game_state = make_game_state(tmp_path, words)
+    fm = game_state.feedback_matrix()
+    game_state.parse_line(solver.format_feedback('eerie', solver.feedback_code('eerie', 'nasty')))
+    candidates = [t for t in words if solver.feedback_code('eerie', t) == 0]
+    assert candidates == ['nasty', 'tonal', 'sassy']
+    assert [fm.target_words[t] for t in game_state.target_candidates()] == candidates
+    scored = game_state._single_guess_partition(fm, metric=metric)
+    assert sorted(word for (word, score) in scored) == sorted(words)
+    for (word, score) in scored:
+        counts = collections.Counter(solver.feedback_code(word, t) for t in candidates)
+        expected = solver.partition_score(counts, metric) + (1e-6 if word in candidates else 0)
+        assert score == pytest.approx(expected, rel=0, abs=1e-9)
+    assert [score for (word, score) in scored] == sorted((score for (word, score) in scored), reverse=True)
+
+
+def test_matrix_hard_mode_guesses_match_is_hard_mode_guess():
+    rng = random.Random(27)
+    words = list(dict.fromkeys(random_words(rng, 5, 80)))
+    fm = solver.FeedbackMatrix(words, words[:30])
+    for word in words[:20]:
+        for target in words[:30]:
+            history = [(word, solver.feedback_code(word, target))]
+            allowed = [guess_id for (guess_id, guess) in enumerate(words) if solver.is_hard_mode_guess(guess, history)]
+            assert solver.bitset_ids(fm.hard_mode_guesses(*history[0])) == allowed
+
+
+def test_multi_board_feedback_lines(tmp_path):
+    game_state = make_game_state(tmp_path, ['arose', 'nasty', 'tonal', 'stone', 'onset'], boards=2)
+    game_state.parse_line('a r o* s? e*, a? r o s? e')
+    assert game_state.solved == [False, False]
+    assert [board.history for board in game_state.boards] == [[solver.parse_feedback('aro*s?e*')], [solver.parse_feedback('a?ros?e')]]
+    fm = game_state.feedback_matrix()
+    assert [[fm.target_words[t] for t in board.target_candidates()] for board in game_state.boards] == [['stone'], ['nasty']]
+    game_state.parse_line('CORRECT,n*a*s*t*y*')
+    assert game_state.solved == [True, False]
+    assert len(game_state.boards[0].history) == 1
+    # a line without a field per board is ignored
+    game_state.parse_line('tonal')
+    assert len(game_state.boards[1].history) == 2
@@ -0,0 +1,375 @@
+import contextlib
+import json
+import os.path
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+import wordle
+from solver import Dictionary, FeedbackMatrix, feedback_code
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def in_root(monkeypatch):
+    # the players and dictionaries are found relative to the repository
+    monkeypatch.chdir(root)
+
+
+def targets_dictionary():
+    return Dictionary(os.path.join(root, 'dicts', '5_letter_wordle_targets.txt'), 5)
+
+
+def test_tournament_is_reproducible():
+    d = targets_dictionary()
+    games = list(wordle.choose_targets(d, 12, False, 1, 7))
+    players = ['./solver.py --strategy 29', './solver.py --strategy 31']
+    runs = []
+    for workers in [1, 1, 2]:
+        records = {}
+        wordle.run_tournament(players, games, set(d.words), 6, workers, game_records=lambda p, r: records.setdefault(p, []).extend(r), seed=7)
+        runs.append({p: sorted(r[:5] for r in rs) for (p, rs) in records.items()})
+    assert runs[0] == runs[1] == runs[2]
+
+
+def run_wordle(*argv, env=None, check=True):
+    """Runs wordle.py with argv, and returns its output."""
+    env = None if env is None else {**os.environ, **env}
+    return subprocess.run([sys.executable, 'wordle.py', *argv], check=check, capture_output=True, text=True, cwd=root, env=env, timeout=120).stdout
+
+
+def read_trace(filename):
+    with open(filename) as infile:
+        return [json.loads(line) for line in infile]
+
+
+@pytest.mark.parametrize('mode', [[], ['--processes', '2']])
+def test_exec_records_no_protocol_offer(tmp_path, mode):
+    trace = tmp_path / 'trace.jsonl'
+    run_wordle('4', '--seed', '1', '--exec', './solver.py --game --offer_protocol_2 --strategy 3', '--trace', str(trace), *mode)
+    for record in read_trace(trace):
+        assert record['outcome'] == 'won'
+        assert None not in record['codes']
+        assert 'PROTOCOL 2' not in record['guesses']
+
+
+def test_in_flight_needs_a_protocol_offer():
+    output = run_wordle('4', '--seed', '1', '--exec', './solver.py --game --offer_protocol_2 --strategy 3', '--in_flight', '4')
+    assert 'Games in flight: 4' in output
+    output = run_wordle('4', '--seed', '1', '--exec', './solver.py --game --strategy 3', '--in_flight', '4')
+    assert 'Games in flight' not in output
+    adapter = f'{sys.executable} others/tomlockwood/jkoren_tomlockwood_adapter.py --dictionaries dicts/5_letter_wordle_targets.txt'
+    output = run_wordle('4', '--seed', '1', '--exec', adapter, '--in_flight', '4')
+    assert 'Games in flight' not in output
+    assert 'Played: 4' in output
+
+
+def test_adapter_games_do_not_depend_on_hash_order(tmp_path):
+    adapter = f'{sys.executable} others/tomlockwood/jkoren_tomlockwood_adapter.py --dictionaries dicts/5_letter_wordle_targets.txt'
+    moves = []
+    for hash_seed in ['1', '2']:
+        trace = tmp_path / f'{hash_seed}.jsonl'
+        run_wordle('30', '--seed', '3', '--exec', adapter, '--trace', str(trace), env={'PYTHONHASHSEED': hash_seed})
+        moves.append([(r['game'], r['guesses']) for r in read_trace(trace)])
+    assert moves[0] == moves[1]
+
+
+INTERRUPTED_PLAYER = """
+import os
+import solver
+
+class InterruptedPlayer:
+    \"\"\"Plays as solver.py, but is interrupted when asked to play more than
+    $INTERRUPT_AFTER games.\"\"\"
+
+    def __init__(self, player, games):
+        self.player = player
+        self.games = games
+
+    def reset(self):
+        if self.games == 0:
+            raise KeyboardInterrupt
+        self.games -= 1
+        self.player.reset()
+
+    def __getattr__(self, name):
+        return getattr(self.player, name)
+
+def make_player(argv):
+    return InterruptedPlayer(solver.make_player(argv), int(os.environ.get('INTERRUPT_AFTER', -1)))
+"""
+
+
+def read_checkpoint(filename):
+    with open(filename) as infile:
+        state = json.load(infile)
+    # only the time taken differs between runs
+    del state['stats']['guess_time']
+    return state
+
+
+# strategy 29 guesses at random
+@pytest.mark.parametrize('strategy', ['36', '29'])
+def test_resumed_run_matches_uninterrupted_run(tmp_path, strategy):
+    (tmp_path / 'interrupted_player.py').write_text(INTERRUPTED_PLAYER)
+    player = f'{tmp_path / "interrupted_player.py"} --strategy {strategy}'
+    argv = ['30', '--seed', '5', '--player', player]
+    run_wordle(*argv, '--checkpoint', str(tmp_path / 'whole.json'), '--trace', str(tmp_path / 'whole.jsonl'))
+
+    resumed = ['--checkpoint', str(tmp_path / 'resumed.json'), '--trace', str(tmp_path / 'resumed.jsonl'), '--resume']
+    run_wordle(*argv, *resumed, env={'INTERRUPT_AFTER': '12'}, check=False)
+    assert len(read_checkpoint(tmp_path / 'resumed.json')['done']) == 12
+    assert len(read_trace(tmp_path / 'resumed.jsonl')) == 12
+    output = run_wordle(*argv, *resumed)
+    assert 'resuming after 12 games' in output
+
+    assert read_checkpoint(tmp_path / 'resumed.json') == read_checkpoint(tmp_path / 'whole.json')
+    whole = read_trace(tmp_path / 'whole.jsonl')
+    resumed = read_trace(tmp_path / 'resumed.jsonl')
+    assert [r['game'] for r in resumed] == list(range(30))
+    for r in whole + resumed:
+        del r['seconds']
+    assert resumed == whole
+
+
+def test_terminated_run_records_the_games_it_saved(tmp_path):
+    argv = ['200', '--seed', '5', '--player', './solver.py --strategy 36', '--checkpoint', str(tmp_path / 'run.json'),
+            '--checkpoint_interval', '0', '--trace', str(tmp_path / 'run.jsonl'), '--results_db', str(tmp_path / 'run.db')]
+    process = subprocess.Popen([sys.executable, 'wordle.py', *argv], stdout=subprocess.DEVNULL, cwd=root)
+    try:
+        while not os.path.exists(tmp_path / 'run.json'):
+            time.sleep(0.1)
+        process.terminate()
+        process.wait(timeout=60)
+    finally:
+        process.kill()
+    done = read_checkpoint(tmp_path / 'run.json')['done']
+    assert 0 < len(done) < 200
+    assert sorted(r['game'] for r in read_trace(tmp_path / 'run.jsonl')) == done
+    with contextlib.closing(sqlite3.connect(tmp_path / 'run.db')) as connection:
+        assert [g for (g,) in connection.execute('SELECT game FROM games ORDER BY game')] == done
+
+    run_wordle(*argv, '--resume')
+    assert sorted(r['game'] for r in read_trace(tmp_path / 'run.jsonl')) == list(range(200))
+    with contextlib.closing(sqlite3.connect(tmp_path / 'run.db')) as connection:
+        assert connection.execute('SELECT run FROM runs').fetchall() == [(1,)]
+        assert connection.execute('SELECT run, game FROM games ORDER BY game').fetchall() == [(1, g) for g in range(200)]
+
+
+def test_trace_has_a_record_per_game(tmp_path):
+    trace = tmp_path / 'trace.jsonl'
+    run_wordle('6', '--seed', '2', '--boards', '2', '--player', './solver.py --strategy 36 --boards 2', '--trace', str(trace))
+    records = read_trace(trace)
+    assert [r['game'] for r in records] == list(range(6))
+    for record in records:
+        assert set(record) == {'game', 'targets', 'outcome', 'guesses', 'codes', 'seconds'}
+        assert len(record['targets']) == 2
+        assert record['outcome'] in ('won', 'lost', 'gave up')
+        assert len(record['guesses']) == len(record['codes']) == len(record['seconds'])
+        for (guess, codes, seconds) in zip(record['guesses'], record['codes'], record['seconds']):
+            # a player that gives up guesses null, and an invalid guess has no codes
+            assert guess is None or isinstance(guess, str)
+            assert codes is None or len(codes) == 2
+            assert all(code is None or 0 <= code < 3 ** 5 for code in codes or [])
+            assert seconds >= 0
+        # word_length + boards attempts
+        assert len([codes for codes in record['codes'] if codes is not None]) <= 7
+        if record['outcome'] == 'won':
+            assert set(record['targets']) <= set(record['guesses'])
+
+
+def test_hard_mode_guesses_use_every_hint():
+    valid_words = {'arose', 'nasty', 'drone', 'those', 'stone'}
+    referee = wordle.Referee(['stone'], valid_words, 6, wordle.Statistics(), hard=True)
+    assert referee.respond('arose') == [('feedback', 'arose', [feedback_code('arose', 'stone')])]
+    # nasty drops the green o and e, drone the yellow s
+    assert referee.respond('nasty') == [('invalid',)]
+    assert referee.respond('drone') == [('invalid',)]
+    assert referee.respond('those') == [('feedback', 'those', [feedback_code('those', 'stone')])]
+    assert referee.respond('stone') == [('won',)]
+    assert referee.attempt == 3
+
+    easy = wordle.Referee(['stone'], valid_words, 6, wordle.Statistics())
+    easy.respond('arose')
+    assert easy.respond('nasty')[0][0] == 'feedback'
+
+
+def test_boards_are_solved_one_at_a_time():
+    valid_words = {'arose', 'nasty', 'tonal', 'stone'}
+    referee = wordle.Referee(['nasty', 'stone'], valid_words, 7, wordle.Statistics())
+    assert referee.respond('arose') == [('feedback', 'arose', [feedback_code('arose', 'nasty'), feedback_code('arose', 'stone')])]
+    assert referee.respond('stone') == [('feedback', 'stone', [feedback_code('stone', 'nasty'), None])]
+    assert wordle.response_text(('feedback', 'stone', [feedback_code('stone', 'nasty'), None])) == 's?t?on?e,CORRECT\n'
+    assert referee.respond('tonal') == [('feedback', 'tonal', [feedback_code('tonal', 'nasty'), None])]
+    assert not referee.over
+    assert referee.respond('nasty') == [('won',)]
+    assert referee.stats.histogram == {4: 1}
+
+
+def test_boards_lose_after_max_attempts():
+    # wordle.py allows word_length + boards attempts
+    referee = wordle.Referee(['nasty', 'stone'], {'arose', 'tonal'}, 5 + 2, wordle.Statistics())
+    for attempt in range(6):
+        assert referee.respond('arose')[0][0] == 'feedback'
+    assert referee.respond('tonal') == [('lost', 'nasty, stone')]
+    assert referee.attempt == 7 and referee.outcome == 'lost'
+
+
+def test_adversarial_candidates_keep_the_largest_partition():
+    words = ['arose', 'nasty', 'tonal', 'eerie', 'sassy', 'tease', 'stone', 'onset', 'notes', 'loser']
+    fm = FeedbackMatrix(words, words)
+    ids = lambda *targets: [words.index(t) for t in targets]
+    everything = list(range(len(words)))
+    assert wordle.adversarial_candidates(fm, 'eerie', everything) == ids('nasty', 'tonal', 'sassy')
+    # loser and onset tie with arose and tease, but have the lower code
+    assert feedback_code('sassy', 'loser') < feedback_code('sassy', 'arose')
+    assert wordle.adversarial_candidates(fm, 'sassy', everything) == ids('onset', 'loser')
+    # every partition has one target: not winning goes first, then the lowest code
+    assert wordle.adversarial_candidates(fm, 'nasty', everything) == ids('eerie')
+    assert wordle.adversarial_candidates(fm, 'nasty', ids('nasty', 'sassy')) == ids('sassy')
+    assert wordle.adversarial_candidates(fm, 'nasty', ids('nasty')) == ids('nasty')
+
+
+def test_results_store_round_trip(tmp_path):
+    valid_words = {'raise', 'tonal', 'nasty'}
+    won = wordle.Referee(['nasty'], valid_words, 6, wordle.Statistics())
+    for (guess, seconds) in [('raise', 0.5), ('nasty!', 0.25), ('nasty', 0.125)]:
+        won.respond(guess, seconds)
+    gave_up = wordle.Referee(['tonal'], valid_words, 6, wordle.Statistics())
+    for (guess, seconds) in [('raise', 1.0), (None, 0.5)]:
+        gave_up.respond(guess, seconds)
+
+    filename = str(tmp_path / 'results.db')
+    settings = {'dictionary': '5_letter_wordle_targets.txt', 'word_length': 5, 'hard': False}
+    store = wordle.ResultsStore(filename, batch_size=1)
+    run = store.start_run('./solver.py --strategy 36', settings, 3)
+    store.add(run, [wordle.game_record(0, won)])
+    store.add(run, [wordle.game_record(1, gave_up)])
+    store.close()
+
+    with contextlib.closing(sqlite3.connect(filename)) as connection:
+        runs = connection.execute('SELECT run, player, dictionary, word_length, seed, settings FROM runs').fetchall()
+        games = connection.execute('SELECT * FROM games ORDER BY game').fetchall()
+    assert runs == [(run, './solver.py --strategy 36', '5_letter_wordle_targets.txt', 5, 3, json.dumps(settings))]
+    assert games == [
+        (run, 0, 'nasty', 'won', 2, 'raise nasty! nasty', 0.875),
+        (run, 1, 'tonal', 'gave up', 2, 'raise OUT OF GUESSES', 1.5),
+    ]
+
+
+@pytest.mark.parametrize('num_games,exhaust,boards', [(50, False, 1), (50, False, 2), (0, True, 1)])
+def test_shards_partition_the_games(num_games, exhaust, boards):
+    d = targets_dictionary()
+    whole = list(wordle.choose_targets(d, num_games, exhaust, boards, 11))
+    shards = [list(wordle.choose_targets(d, num_games, exhaust, boards, 11, (i, 3))) for i in range(3)]
+    ids = [{game_id for (game_id, _) in shard} for shard in shards]
+    assert not ids[0] & ids[1] and not ids[0] & ids[2] and not ids[1] & ids[2]
+    assert sorted(sum(shards, [])) == whole
+
+
+@pytest.mark.parametrize('strategy', ['36', '29'])
+def test_sharded_runs_play_the_whole_run(tmp_path, strategy):
+    player = f'./solver.py --strategy {strategy}'
+    run_wordle('9', '--seed', '4', '--player', player, '--trace', str(tmp_path / 'whole.jsonl'))
+    records = []
+    for i in range(3):
+        run_wordle('9', '--seed', '4', '--player', player, '--shard', f'{i}/3', '--trace', str(tmp_path / f'{i}.jsonl'))
+        records += read_trace(tmp_path / f'{i}.jsonl')
+    whole = read_trace(tmp_path / 'whole.jsonl')
+    assert sorted((r['game'], r['targets'], r['guesses']) for r in records) == [(r['game'], r['targets'], r['guesses']) for r in whole]
+
+
+def test_shard_without_games():
+    output = run_wordle('3', '--seed', '4', '--shard', '4/8', '--player', './solver.py --strategy 36')
+    assert 'Played: 0' in output
+    assert 'mean: nan stddev: nan' in output
+
+
+def free_port():
+    with contextlib.closing(socket.socket()) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize('strategy', ['36', '29'])
+def test_workers_play_their_own_player(tmp_path, strategy):
+    player = f'./solver.py --strategy {strategy}'
+    address = f'127.0.0.1:{free_port()}'
+    argv = ['8', '--seed', '6', '--player', player]
+    run_wordle(*argv, '--trace', str(tmp_path / 'whole.jsonl'))
+    coordinator = subprocess.Popen([sys.executable, 'wordle.py', *argv, '--trace', str(tmp_path / 'coordinated.jsonl'), '--coordinate', address],
+                                   stdout=subprocess.PIPE, text=True, cwd=root)
+    try:
+        for line in coordinator.stdout:
+            if line.startswith('waiting for workers'):
+                break
+        other = subprocess.run([sys.executable, 'wordle.py', '--worker', address, '--player', './solver.py --strategy 3'],
+                               capture_output=True, text=True, cwd=root)
+        assert other.returncode != 0
+        assert 'the coordinator plays' in other.stderr
+        run_wordle('--worker', address, '--player', player)
+        coordinator.communicate(timeout=60)
+        assert coordinator.returncode == 0
+    finally:
+        coordinator.kill()
+        coordinator.wait()
+    (whole, coordinated) = (read_trace(tmp_path / 'whole.jsonl'), read_trace(tmp_path / 'coordinated.jsonl'))
+    assert sorted((r['game'], r['targets'], r['guesses']) for r in coordinated) == [(r['game'], r['targets'], r['guesses']) for r in whole]
+
+
+def test_tree_plays_as_sequential_games(tmp_path):
+    argv = ['40', '--seed', '8', '--player', './solver.py --strategy 36']
+    sequential = run_wordle(*argv, '--trace', str(tmp_path / 'sequential.jsonl'))
+    tree = run_wordle(*argv, '--tree', '--trace', str(tmp_path / 'tree.jsonl'))
+    results = lambda output: output[output.index('Wins'):]
+    assert results(tree) == results(sequential)
+    moves = lambda filename: sorted((r['game'], r['guesses'], r['codes']) for r in read_trace(filename))
+    assert moves(tmp_path / 'tree.jsonl') == moves(tmp_path / 'sequential.jsonl')
+
+
+def test_tree_records_the_time_of_each_guess_once():
+    d = targets_dictionary()
+    games = list(wordle.choose_targets(d, 100, False, 1, 9))
+    player = wordle.load_player('./solver.py --strategy 36')
+    stats = wordle.Statistics()
+    started = time.perf_counter()
+    wordle.play_tree(player, games, set(d.words), 6, stats)
+    assert stats.played() == 100
+    assert stats.guess_time <= time.perf_counter() - started
+
+
+CRASHING_SOLVER = """
+import os
+import sys
+
+# the first 24 copies started exit after their first guess
+for i in range(24):
+    try:
+        os.close(os.open(f'{sys.argv[1]}.{i}', os.O_CREAT | os.O_EXCL))
+        break
+    except FileExistsError:
+        pass
+else:
+    os.execv(sys.executable, [sys.executable, 'solver.py', '--game', '--strategy', '36'])
+print('arose', flush=True)
+"""
+
+
+def test_processes_that_exit_lose_their_game(tmp_path):
+    (tmp_path / 'crashing_solver.py').write_text(CRASHING_SOLVER)
+    trace = tmp_path / 'trace.jsonl'
+    command = f'{sys.executable} {tmp_path / "crashing_solver.py"} {tmp_path / "crashed"}'
+    output = run_wordle('32', '--seed', '3', '--processes', '8', '--exec', command, '--trace', str(trace))
+    assert 'Wins 8 Losses: 24' in output
+    records = read_trace(trace)
+    assert sorted(r['game'] for r in records) == list(range(32))
+    for record in records:
+        if record['outcome'] == 'lost':
+            assert record['guesses'] == ['arose', '']
+        else:
+            assert record['outcome'] == 'won'
@@ -1,40 +1,23 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
+import concurrent.futures
+import importlib
+import json
 import logging
 import math
 import os.path
 import random
+import signal
+import socket
+import sqlite3
 import subprocess
 import sys
 import time
+import types
 
-from solver import Dictionary
-
-def evaluate(guess, target):
-    target_letters = count_letters(target)
-    guess_letters = count_letters(guess)
-    codes = [''] * len(target)
-    for (i, c) in enumerate(guess):
-        if target[i] == c:
-            codes[i] = '*'
-            target_letters[c] -= 1
-            guess_letters[c] -= 1
-    for (i, c) in enumerate(guess):
-        if (target[i] != c) and (guess_letters.get(c, 0) > 0) and (target_letters.get(c, 0) > 0):
-            codes[i] = '?'
-            target_letters[c] -= 1
-            guess_letters[c] -= 1
-    resp = ''
-    for (i, c) in enumerate(guess):
-        resp += c + codes[i]
-    return resp
-
-def count_letters(word):
-    letters = {}
-    for c in word:
-        letters[c] = letters.get(c, 0) + 1
-    return letters
+from solver import PROTOCOL_2, Dictionary, FeedbackMatrix, feedback_code, format_feedback, is_hard_mode_guess, read_line_batches, winning_code
 
 class Statistics:
     def __init__(self):
@@ -42,6 +25,8 @@ class Statistics:
         self.losses = 0
         self.histogram = {}
         self.gave_up = 0
+        self.guesses = 0
+        self.guess_time = 0.0
 
     def win(self, attempts):
         self.wins += 1
@@ -53,6 +38,35 @@ class Statistics:
     def gaveup(self):
         self.gave_up += 1
 
+    def guessed(self, seconds):
+        self.guesses += 1
+        self.guess_time += seconds
+
+    def merge(self, other):
+        self.wins += other.wins
+        self.losses += other.losses
+        self.gave_up += other.gave_up
+        for (attempts, count) in other.histogram.items():
+            self.histogram[attempts] = self.histogram.get(attempts, 0) + count
+        self.guesses += other.guesses
+        self.guess_time += other.guess_time
+
+    def state(self):
+        """The counts, as a dict that JSON can encode."""
+        return vars(self)
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls()
+        stats.__dict__.update(state)
+        # JSON has string keys
+        stats.histogram = {int(k): v for (k, v) in state['histogram'].items()}
+        return stats
+
+    def latency(self):
+        """Mean seconds the player took per guess."""
+        return self.guess_time / max(self.guesses, 1)
+
     def played(self):
         return self.wins + self.losses + self.gave_up
 
@@ -81,17 +95,170 @@ class Statistics:
         ret += "\n"
         return ret
 
-def choose_target_word(d, num_games, exhaust):
-    game_id = 0
-    if exhaust:
-        while (game_id < len(d.words)):
-            yield d.words[game_id]
-            game_id += 1
-    else:
-        while (game_id < num_games):
-            word = random.choice(d.words)
-            yield word
-            game_id += 1
+class Checkpoint:
+    """The games of a run completed so far, by their index in the order of
+    choose_targets(), and their Statistics. completed() saves them to
+    filename at most every interval seconds, so an interrupted run can be
+    resumed with the same settings, and the same run of a ResultsStore.
+    The outputs, such as a Trace or
+    ResultsStore, are flushed before every save, so no game is saved as
+    completed before they have recorded it."""
+
+    def __init__(self, filename, settings, seed, interval=60):
+        self.filename = filename
+        self.settings = settings
+        self.seed = seed
+        self.interval = interval
+        self.done = set()
+        self.stats = Statistics()
+        self.run = None
+        self.outputs = []
+        self.saved = time.monotonic()
+
+    def load(self):
+        """Loads the games completed by a previous run with the same
+        settings, and takes its seed and ResultsStore run."""
+        with open(self.filename, 'r') as infile:
+            state = json.load(infile)
+        if state['settings'] != self.settings:
+            raise ValueError(f'{self.filename} is a checkpoint of a run with different settings')
+        self.seed = state['seed']
+        self.done = set(state['done'])
+        self.stats = Statistics.from_state(state['stats'])
+        self.run = state.get('run')
+
+    def completed(self, game_id, stats):
+        """Records the game game_id as played, and stats of that game alone."""
+        self.done.add(game_id)
+        self.stats.merge(stats)
+        if time.monotonic() - self.saved >= self.interval:
+            self.save()
+
+    def save(self):
+        for output in self.outputs:
+            output.flush()
+        state = {'settings': self.settings, 'seed': self.seed, 'done': sorted(self.done), 'stats': self.stats.state(), 'run': self.run}
+        with open(self.filename + '.tmp', 'w') as outfile:
+            json.dump(state, outfile)
+        os.replace(self.filename + '.tmp', self.filename)
+        self.saved = time.monotonic()
+        logger.info('saved checkpoint of %d games to %s', len(self.done), self.filename)
+
+class Trace:
+    """Streams to filename a line of JSON for every game over, with the
+    game id, its targets, the outcome, and the guesses with their feedback
+    codes and the seconds the player took, as recorded by its Referee.
+    Lines are buffered, and written buffer_size bytes at a time."""
+
+    def __init__(self, filename, append=False, buffer_size=1 << 20):
+        self.outfile = open(filename, 'a' if append else 'w', buffering=buffer_size)
+
+    def write(self, game_id, referee):
+        record = {
+            'game': game_id,
+            'targets': referee.targets,
+            'outcome': referee.outcome,
+            'guesses': [m[0] for m in referee.moves],
+            'codes': [m[1] for m in referee.moves],
+            'seconds': [m[2] for m in referee.moves],
+        }
+        self.outfile.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def flush(self):
+        self.outfile.flush()
+
+    def close(self):
+        self.outfile.close()
+
+def game_record(game_id, referee):
+    """The (game, targets, outcome, attempts, guesses, seconds) of a game
+    over, as stored by ResultsStore."""
+    guesses = ' '.join(m[0] if m[0] is not None else 'OUT OF GUESSES' for m in referee.moves)
+    seconds = sum(m[2] for m in referee.moves if m[2] is not None)
+    return (game_id, ','.join(referee.targets), referee.outcome, referee.attempt, guesses, seconds)
+
+class ResultsStore:
+    """Records the game_record() of every game in the SQLite database
+    filename, under a run per player and invocation of wordle.py, so runs
+    can be compared later. Games are inserted batch_size per transaction."""
+
+    def __init__(self, filename, batch_size=1000):
+        self.connection = sqlite3.connect(filename)
+        self.batch_size = batch_size
+        self.pending = []
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS runs (
+                run INTEGER PRIMARY KEY, started REAL, player TEXT,
+                dictionary TEXT, word_length INTEGER, seed INTEGER, settings TEXT)''')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS games (
+                run INTEGER REFERENCES runs(run), game INTEGER, targets TEXT,
+                outcome TEXT, attempts INTEGER, guesses TEXT, seconds REAL)''')
+
+    def start_run(self, player, settings, seed):
+        """Adds a run of player, and returns its id."""
+        with self.connection:
+            cursor = self.connection.execute('INSERT INTO runs (started, player, dictionary, word_length, seed, settings) VALUES (?, ?, ?, ?, ?, ?)',
+                                             (time.time(), player, settings['dictionary'], settings['word_length'], seed, json.dumps(settings)))
+        return cursor.lastrowid
+
+    def add(self, run, records):
+        """Adds the game_record() of some games of run."""
+        self.pending.extend((run,) + r for r in records)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self.connection:
+            self.connection.executemany('INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?)', self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+def game_random(seed, game_id):
+    """The random number generator of game game_id, seeded from both, so the
+    targets of a game do not depend on the games played before it."""
+    return random.Random(f'{seed}/{game_id}')
+
+def seed_player(seed, game_id, player_id=0):
+    """Seeds the random module before game game_id of player player_id, so
+    the games of players using it do not depend on the games played before
+    them, nor on the shard, worker or resumed run that plays them."""
+    random.seed(f'{seed}/{player_id}/{game_id}')
+
+def choose_targets(d, num_games, exhaust, boards, seed, shard=(0, 1)):
+    """Yields the (game_id, targets) of every game of shard (i, n), the
+    games whose game_id % n == i, with one target per board. The union of
+    the n shards is every game, with the same targets."""
+    (i, n) = shard
+    for game_id in range(i, len(d.words) if exhaust else num_games, n):
+        if exhaust:
+            # every word is the target of the first board once
+            yield (game_id, [d.words[(game_id + b) % len(d.words)] for b in range(boards)])
+        elif boards == 1:
+            yield (game_id, [game_random(seed, game_id).choice(d.words)])
+        else:
+            yield (game_id, game_random(seed, game_id).sample(d.words, boards))
+
+def parse_shard(text):
+    """The (i, n) of --shard i/n."""
+    (i, n) = map(int, text.split('/'))
+    if not 0 <= i < n:
+        raise ValueError(f'shard {text} is not i/n with 0 <= i < n')
+    return (i, n)
+
+def adversarial_candidates(fm, guess, candidates):
+    """Partitions the candidate target ids by their feedback to guess, and
+    returns the largest partition. Ties go to not winning, then to the lowest
+    feedback code."""
+    row = fm.row_for_word(guess)
+    partitions = {}
+    for t in candidates:
+        partitions.setdefault(row[t], []).append(t)
+    win = winning_code(fm.word_length)
+    (code, largest) = max(partitions.items(), key=lambda p: (len(p[1]), p[0] != win, -p[0]))
+    return largest
 
 def safe_write(out_pipe, msg):
     if out_pipe != sys.stdout:
@@ -99,126 +266,868 @@ def safe_write(out_pipe, msg):
     out_pipe.write(msg)
     out_pipe.flush()
 
-def safe_readline(p):
-    guess = in_pipe.readline()
-    if type(guess) == bytes:
-        guess = guess.decode('utf-8')
-    return guess.strip()
-
-##############################################################################
+def start_solver(command):
+    """Runs the --exec command, or connects to the fork server of
+    `solver.py --fork_server PATH` for `unix:PATH`. Returns the
+    (in_pipe, out_pipe) of the solver, and the process or socket to close
+    when done."""
+    if command.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(command[len('unix:'):])
+        return (sock.makefile('rb'), sock.makefile('wb'), sock)
+    spargs = list(filter(lambda x: len(x) > 0, command.split(' ')))
+    p = subprocess.Popen(spargs, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    return (p.stdout, p.stdin, p)
 
+def negotiate(in_pipe, out_pipe, multiplex=False):
+    """Reads the first line of a solver from start_solver(). `solver.py
+    --game --offer_protocol_2` starts by offering protocol 2, which is
+    accepted if multiplex,
+    or else declined as an invalid word before any game starts. Returns
+    whether protocol 2 was accepted, and the lines read that are guesses of
+    the first game, from a solver that made no offer."""
+    line = in_pipe.readline()
+    if decode_guess(line) != PROTOCOL_2:
+        return (False, [line])
+    safe_write(out_pipe, f'{PROTOCOL_2}\n' if multiplex else response_text(('invalid',)))
+    return (multiplex, [])
 
-parser = argparse.ArgumentParser(description='Wordle')
-parser.add_argument('num_games', type=int, default=1, nargs='?', help='number_of_games')
-parser.add_argument('word_length', type=int, default=5, nargs='?', help='length of word')
-parser.add_argument('--seed', type=int, default=int(time.time()), help='random number seed')
-parser.add_argument('--exhaust', action='store_true', default=False, help='Systematically play with every word in the dictionary')
-parser.add_argument('--exec', type=str, default=None, help='Program to run to play Wordle')
-parser.add_argument('--debug', action='store_true', default=False)
-parser.add_argument('--verbose', action='store_true', default=False)
-parser.add_argument('--dictionary_dir', type=str, default='./dicts', help='Directory containing dictionaries')
-parser.add_argument('--dictionary', type=str, default='5_letter_wordle_targets.txt', help='Alternate dictionary')
-args = parser.parse_args()
-word_length = args.word_length
-seed = args.seed
+async def decline_protocol_2(reader, writer, timeout=None):
+    """negotiate() of the solver of an asyncio connection, without
+    accepting protocol 2."""
+    line = await asyncio.wait_for(reader.readline(), timeout)
+    if decode_guess(line) != PROTOCOL_2:
+        return [line]
+    writer.write(bytes(response_text(('invalid',)), 'utf-8'))
+    await writer.drain()
+    return []
 
-logging.basicConfig()
-logger = logging.getLogger('wordle.py')
-if args.verbose:
-    logger.setLevel(logging.INFO)
-if args.debug:
-    logger.setLevel(logging.DEBUG)
-
-dict_filename = os.path.join(args.dictionary_dir, args.dictionary)
-
-print(f'loading {dict_filename}...')
-d = Dictionary(dict_filename, word_length)
-valid_words = set(d.words)
-random.seed(seed)
-
-in_pipe = sys.stdin
-out_pipe = sys.stdout
-p = None
-if args.exec is not None:
-    spargs = list(filter(lambda x: len(x) > 0, args.exec.split(' ')))
-    p = subprocess.Popen(spargs, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-    in_pipe = p.stdout
-    out_pipe = p.stdin
-
-stats = Statistics()
-max_attempts = word_length + 1
-word_generator = choose_target_word(d, args.num_games, args.exhaust)
-print('running...')
-game_id = -1
-while True:
-    game_id += 1
-    target = None
+def load_player(command):
+    """Loads in process the player that `--exec command` would run, a Python
+    script defining make_player(argv) such as solver.py."""
+    argv = list(filter(lambda x: len(x) > 0, command.split(' ')))
+    scripts = [i for (i, a) in enumerate(argv) if a.endswith('.py')]
+    if len(scripts) == 0:
+        raise ValueError(f'{command} does not run a Python script')
+    script = argv[scripts[0]]
+    directory = os.path.dirname(os.path.abspath(script))
+    # While the script is imported its directory goes first on the path, and
+    # the modules it would find there are set aside from ours of the same
+    # name (others/tomlockwood has its own wordle.py).
+    shadowed = {}
+    for filename in os.listdir(directory):
+        name = os.path.splitext(filename)[0]
+        module = sys.modules.get(name)
+        if filename.endswith('.py') and module is not None and os.path.dirname(os.path.abspath(getattr(module, '__file__', ''))) != directory:
+            shadowed[name] = sys.modules.pop(name)
+    sys.path.insert(0, directory)
     try:
-        target = next(word_generator)
-    except StopIteration:
-        break
-    logger.info("New game (%d / %d). target: %s", game_id, args.num_games, target)
-    correct = False
-    gave_up = False
-    attempt = 1
-    while attempt <= max_attempts:
-        guess = None
-        target_letters = count_letters(target)
-        try:
-            if out_pipe == sys.stdout:
-                safe_write(out_pipe, '> ')
-            guess = safe_readline(in_pipe)
-            logger.debug('Attempt %d received %s', attempt, str(guess))
-        except EOFError:
-            break;
+        module = importlib.import_module(os.path.splitext(os.path.basename(script))[0])
+    finally:
+        sys.path.remove(directory)
+        sys.modules.update(shadowed)
+    return module.make_player(argv[scripts[0] + 1:])
+
+def decode_guess(line):
+    """The guess of a line of the text protocol: None if the player gave up,
+    or '' at the end of the input."""
+    if type(line) == bytes:
+        line = line.decode('utf-8')
+    guess = line.strip()
+    if guess == 'OUT OF GUESSES':
+        return None
+    return guess
+
+def response_text(event, interactive=False):
+    """The text protocol reply to a Referee event."""
+    if event[0] == 'invalid':
+        return "INVALID WORD\n"
+    elif event[0] == 'feedback':
+        (guess, codes) = event[1:]
+        resp = ','.join('CORRECT' if code is None else format_feedback(guess, code) for code in codes)
+        return f"{resp}\n\n" if interactive else f"{resp}\n"
+    elif event[0] == 'won':
+        return "CORRECT\n\n" if interactive else "CORRECT\n"
+    else:
+        return f"YOU LOSE\nThe word was {event[1]}\n\n" if interactive else "YOU LOSE\n"
+
+class Referee:
+    """Applies the rules to one game, with one target per board. respond()
+    takes each guess of the player, or None if the player gave up, or '' at
+    the end of the input, and the seconds the player took to make it,
+    records the outcome in stats once the game is over, and returns the
+    events to reply with: ('invalid',), ('feedback', guess, codes),
+    ('won',), or ('lost', target). codes has one feedback code per board,
+    None for a solved board.
+
+    moves has a [guess, codes, seconds] for every guess, with the codes of
+    the boards not solved by an earlier guess, or None if it was not valid.
+    outcome is 'won', 'lost' or 'gave up' once the game is over.
+
+    With adversarial_fm the target is instead picked as the game goes from
+    the targets of adversarial_fm."""
+
+    def __init__(self, targets, valid_words, max_attempts, stats, hard=False, adversarial_fm=None):
+        self.targets = targets
+        self.valid_words = valid_words
+        self.max_attempts = max_attempts
+        self.stats = stats
+        self.hard = hard
+        self.adversarial_fm = adversarial_fm
+        self.candidates = None
+        if adversarial_fm is not None:
+            self.candidates = list(range(len(adversarial_fm.target_words)))
+        self.solved = [False] * len(targets)
+        self.history = []
+        self.moves = []
+        self.attempt = 1
+        self.over = False
+        self.outcome = None
+
+    def target(self):
+        return ', '.join(self.targets)
+
+    def lose(self, guess):
+        self.over = True
+        self.outcome = 'lost'
+        self.stats.lose()
+        logger.info('Player lost. %s != %s Attempts %d', self.target(), guess, self.attempt)
+        return [('lost', self.target())]
+
+    def respond(self, guess, seconds=None):
+        if seconds is not None:
+            self.stats.guessed(seconds)
+        self.moves.append([guess, None, seconds])
         if guess == '':
-            break
-        guessed_letters = count_letters(guess)
-        if guess == 'OUT OF GUESSES':
+            return self.lose(guess)
+        if guess is None:
             logger.info('Player gave up')
-            stats.gaveup()
-            gave_up = True
-            break
-        elif guess not in valid_words or len(guess) != len(target):
+            self.stats.gaveup()
+            self.over = True
+            self.outcome = 'gave up'
+            return []
+        elif guess not in self.valid_words or len(guess) != len(self.targets[0]):
             logger.info('invalid word %s', guess)
-            safe_write(out_pipe, "INVALID WORD\n")
-            attempt -= 1    # redo the attempt
-        elif guess == target:
-            safe_write(out_pipe, "CORRECT\n")
-            if out_pipe == sys.stdout:
-                safe_write(out_pipe, "\n")
-            correct = True
-            logger.info('Player won. %s Attempts %d', target, attempt)
-            stats.win(attempt)
+            return [('invalid',)]
+        elif self.hard and not is_hard_mode_guess(guess, self.history):
+            logger.info('hard mode violation %s', guess)
+            return [('invalid',)]
+
+        if self.adversarial_fm is not None:
+            # Every word of the largest partition has the same feedback, so
+            # the first stands in for the target.
+            self.candidates = adversarial_candidates(self.adversarial_fm, guess, self.candidates)
+            self.targets = [self.adversarial_fm.target_words[self.candidates[0]]]
+            logger.debug('%d candidates remain', len(self.candidates))
+
+        feedback = [None if self.solved[i] else feedback_code(guess, t) for (i, t) in enumerate(self.targets)]
+        self.moves[-1][1] = feedback
+        if all(self.solved[i] or guess == t for (i, t) in enumerate(self.targets)):
+            self.over = True
+            self.outcome = 'won'
+            logger.info('Player won. %s Attempts %d', self.target(), self.attempt)
+            self.stats.win(self.attempt)
+            return [('won',)]
+
+        codes = []
+        for (i, t) in enumerate(self.targets):
+            self.solved[i] = self.solved[i] or guess == t
+            codes.append(None if self.solved[i] else feedback[i])
+        self.history.append((guess, feedback_code(guess, self.targets[0])))
+        if self.attempt == self.max_attempts:
+            return self.lose(guess)
+        logger.debug('sending %s , attempt %d', codes, self.attempt)
+        self.attempt += 1
+        return [('feedback', guess, codes)]
+
+class TextSession:
+    """Plays against a solver over the text protocol, either a program run by
+    --exec or the user on stdin and stdout."""
+
+    def __init__(self, in_pipe, out_pipe):
+        self.in_pipe = in_pipe
+        self.out_pipe = out_pipe
+        # lines already read, such as while negotiating the protocol
+        self.pending = []
+
+    def interactive(self):
+        return self.out_pipe == sys.stdout
+
+    def new_game(self):
+        pass
+
+    def next_guess(self):
+        if self.interactive():
+            safe_write(self.out_pipe, '> ')
+        if len(self.pending) > 0:
+            return decode_guess(self.pending.pop(0))
+        try:
+            return decode_guess(self.in_pipe.readline())
+        except EOFError:
+            return ''
+
+    def respond(self, event):
+        safe_write(self.out_pipe, response_text(event, self.interactive()))
+
+class PlayerSession:
+    """Plays in process against a player with reset(), next_guess() and
+    observe(), such as solver.SolverPlayer. observe() gets the feedback
+    code of the guess, or a list of one per board (None once solved) when
+    there are several boards."""
+
+    def __init__(self, player):
+        self.player = player
+
+    def new_game(self):
+        self.player.reset()
+
+    def next_guess(self):
+        return self.player.next_guess()
+
+    def respond(self, event):
+        if event[0] == 'invalid':
+            self.player.observe(None)
+        elif event[0] == 'feedback':
+            codes = event[2]
+            self.player.observe(codes[0] if len(codes) == 1 else codes)
+
+def play_game(session, targets, valid_words, max_attempts, stats, hard=False, adversarial_fm=None):
+    """Plays one game against session, and records the outcome in stats.
+    Returns the Referee of the game, whose targets adversarial mode picks as
+    the game goes."""
+    session.new_game()
+    referee = Referee(targets, valid_words, max_attempts, stats, hard, adversarial_fm)
+    while not referee.over:
+        started = time.perf_counter()
+        guess = session.next_guess()
+        seconds = time.perf_counter() - started
+        logger.debug('Attempt %d received %s', referee.attempt, str(guess))
+        for event in referee.respond(guess, seconds):
+            session.respond(event)
+    return referee
+
+def play_tree(player, games, valid_words, max_attempts, stats, hard=False, game_over=None, seed=0):
+    """Plays games, a list of (game_id, targets) of a single board, all at
+    once against a deterministic player. The games with the same guesses
+    and feedback so far get the same next guess, so the player is asked for
+    one guess per node of its decision tree instead of one per game and
+    attempt. Each game still has its own Referee, and game_over(game_id,
+    referee) is called as it ends. The seconds the player takes to guess at
+    a node are split between its games, so the time recorded is the time
+    the player took.
+
+    The player goes back to the history of a node with its
+    restore(history), if it has one, or else by replaying the history. The
+    random module is seeded at each node with seed_player() from the first
+    of its games, so a player that does use it is at least reproducible."""
+    def restore(history):
+        if hasattr(player, 'restore'):
+            player.restore(history)
+            return
+        player.reset()
+        for (guess, code) in history:
+            while player.next_guess() != guess:
+                player.observe(None)
+            player.observe(code)
+
+    def walk(history, referees):
+        seed_player(seed, referees[0][0])
+        restore(history)
+        while len(referees) > 0:
+            started = time.perf_counter()
+            guess = player.next_guess()
+            seconds = (time.perf_counter() - started) / len(referees)
+            branches = {}
+            for (game_id, referee) in referees:
+                events = referee.respond(guess, seconds)
+                if referee.over:
+                    stats.merge(referee.stats)
+                    if game_over is not None:
+                        game_over(game_id, referee)
+                elif events[0][0] == 'invalid':
+                    branches.setdefault(None, []).append((game_id, referee))
+                else:
+                    branches.setdefault(events[0][2][0], []).append((game_id, referee))
+            if None in branches:
+                # the guess is invalid in every game of the node
+                player.observe(None)
+                referees = branches[None]
+                continue
+            for (code, children) in branches.items():
+                walk(history + [(guess, code)], children)
+            return
+
+    walk([], [(game_id, Referee(targets, valid_words, max_attempts, Statistics(), hard)) for (game_id, targets) in games])
+
+def play_multiplexed(in_pipe, out_pipe, games, valid_words, max_attempts, stats, hard=False, in_flight=64, game_over=None):
+    """Plays games, a list of (game_id, targets), against a solver process
+    that accepted protocol 2 (see solver.serve_multiplexed()), with up to
+    in_flight games at a time. The lines of every game answered by a read
+    are written at once. game_over(game_id, referee) is called as each game
+    ends."""
+    # a batch is at most a line per game in flight, which must fit in the
+    # pipe while the solver is writing its own batch
+    in_flight = max(1, min(in_flight, 1024))
+    unplayed = iter(games)
+    referees = {}
+    asked = {}
+    out = []
+
+    def start_game():
+        game = next(unplayed, None)
+        if game is not None:
+            (game_id, targets) = game
+            referees[game_id] = Referee(targets, valid_words, max_attempts, Statistics(), hard)
+            out.append(f'{game_id} NEW\n')
+            asked[game_id] = time.perf_counter()
+
+    def finish(game_id, referee):
+        stats.merge(referee.stats)
+        if game_over is not None:
+            game_over(game_id, referee)
+
+    for i in range(in_flight):
+        start_game()
+    batches = read_line_batches(in_pipe)
+    while len(referees) > 0:
+        safe_write(out_pipe, ''.join(out))
+        out = []
+        lines = next(batches, None)
+        if lines is None:
+            break
+        answered = time.perf_counter()
+        for line in lines:
+            if len(line) == 0:
+                continue
+            (game_id, guess) = (line.split(' ', 1) + [''])[:2]
+            game_id = int(game_id)
+            referee = referees[game_id]
+            for event in referee.respond(decode_guess(guess), answered - asked[game_id]):
+                out.append(f'{game_id} {response_text(event)}')
+            if referee.over:
+                del referees[game_id]
+                finish(game_id, referee)
+                start_game()
+            else:
+                asked[game_id] = time.perf_counter()
+    # the solver exited: its games in flight and the unplayed games are lost
+    for (game_id, targets) in unplayed:
+        referees[game_id] = Referee(targets, valid_words, max_attempts, Statistics(), hard)
+    for (game_id, referee) in referees.items():
+        referee.respond('')
+        finish(game_id, referee)
+
+async def play_process_games(command, games, valid_words, max_attempts, stats, hard=False, timeout=None, game_over=None):
+    """Plays games, a list of (game_id, targets), against a solver process
+    run from command, or a child of a fork server for `unix:PATH`, over the
+    text protocol, one request in flight at a time. A solver that takes
+    longer than timeout seconds to guess, or exits, loses the game and is
+    restarted. game_over(game_id, referee) is called as each game ends."""
+    reader = None
+    for (game_id, targets) in games:
+        if reader is None:
+            process = None
+            if command.startswith('unix:'):
+                (reader, writer) = await asyncio.open_unix_connection(command[len('unix:'):])
+            else:
+                argv = list(filter(lambda x: len(x) > 0, command.split(' ')))
+                process = await asyncio.create_subprocess_exec(*argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+                (reader, writer) = (process.stdout, process.stdin)
+            pending = None
+        referee = Referee(targets, valid_words, max_attempts, Statistics(), hard)
+        try:
+            if pending is None:
+                pending = await decline_protocol_2(reader, writer, timeout)
+            while not referee.over:
+                started = time.perf_counter()
+                guess = decode_guess(pending.pop(0) if len(pending) > 0 else await asyncio.wait_for(reader.readline(), timeout))
+                for event in referee.respond(guess, time.perf_counter() - started):
+                    writer.write(bytes(response_text(event), 'utf-8'))
+                # wait for the pipe to drain before reading the next guess
+                await writer.drain()
+            if guess == '':
+                raise ConnectionResetError('end of input')
+        except (asyncio.TimeoutError, ConnectionResetError, BrokenPipeError) as e:
+            logger.warning('%s restarted after %s', command, type(e).__name__)
+            if not referee.over:
+                referee.respond('')
+            writer.close()
+            if process is not None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    # the solver already exited
+                    pass
+                await process.wait()
+            reader = None
+        stats.merge(referee.stats)
+        if game_over is not None:
+            game_over(game_id, referee)
+    if reader is not None:
+        writer.close()
+        if process is not None:
+            await process.wait()
+
+def run_processes(command, games, valid_words, max_attempts, processes, hard=False, timeout=None, game_over=None):
+    """Plays games, a list of (game_id, targets), against processes copies
+    of the solver command, each playing a disjoint slice of the games, and
+    returns their Statistics."""
+    results = [Statistics() for _ in range(processes)]
+
+    async def play_all():
+        await asyncio.gather(*(play_process_games(command, games[i::processes], valid_words, max_attempts, results[i], hard, timeout, game_over) for i in range(processes)))
+    asyncio.run(play_all())
+
+    stats = Statistics()
+    for result in results:
+        stats.merge(result)
+    return stats
+
+def parse_host_port(address):
+    (host, port) = address.rsplit(':', 1)
+    return (host, int(port))
+
+async def coordinate(address, player, setup, games, stats, game_over=None, chunk=64, timeout=None):
+    """Hands out games, a list of (game_id, targets), chunk at a time to the
+    run_worker() processes that connect to address, host:port, and records
+    the games they play in stats and with game_over(game_id, referee). The
+    games of a worker that disconnects, or takes longer than timeout seconds
+    per game, are handed to another. Only workers playing player, the
+    {'exec': ..., 'player': ...} of their own command line, are given games,
+    and setup. Workers are not authenticated, and their results are
+    trusted."""
+    unplayed = asyncio.Queue()
+    for i in range(0, len(games), chunk):
+        unplayed.put_nowait(games[i:i + chunk])
+    left = [len(games), unplayed.qsize()]
+    workers = set()
+    finished = asyncio.Event()
+    reported = [time.monotonic()]
+
+    def report():
+        print(f'{len(games) - left[0]} / {len(games)} games played, {len(workers)} workers')
+        reported[0] = time.monotonic()
+
+    async def serve_worker(reader, writer):
+        peer = writer.get_extra_info('peername')
+        shard = None
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if json.loads(line) != player:
+                logger.warning('worker %s does not play %s', peer, player)
+                writer.write(bytes(json.dumps({'error': f'the coordinator plays {player}'}) + '\n', 'utf-8'))
+                await writer.drain()
+                return
+            workers.add(peer)
+            logger.info('worker %s connected', peer)
+            writer.write(bytes(json.dumps(setup) + '\n', 'utf-8'))
+            while not finished.is_set():
+                shard = await unplayed.get()
+                if shard is None:
+                    break
+                writer.write(bytes(json.dumps(shard) + '\n', 'utf-8'))
+                await writer.drain()
+                line = await asyncio.wait_for(reader.readline(), None if timeout is None else timeout * len(shard))
+                if len(line) == 0:
+                    raise ConnectionResetError('end of input')
+                for record in json.loads(line):
+                    referee = types.SimpleNamespace(**record)
+                    referee.stats = Statistics.from_state(record['stats'])
+                    stats.merge(referee.stats)
+                    if game_over is not None:
+                        game_over(record['game_id'], referee)
+                left[0] -= len(shard)
+                left[1] -= 1
+                shard = None
+                if left[1] == 0:
+                    finished.set()
+                    # wake the other workers waiting for games
+                    for w in workers:
+                        unplayed.put_nowait(None)
+                if time.monotonic() - reported[0] >= 1 or finished.is_set():
+                    report()
+            writer.write(b'null\n')
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError) as e:
+            logger.warning('worker %s dropped after %s', peer, type(e).__name__)
+            if shard is not None:
+                unplayed.put_nowait(shard)
+        finally:
+            workers.discard(peer)
+            writer.close()
+
+    (host, port) = parse_host_port(address)
+    server = await asyncio.start_server(serve_worker, host, port)
+    print(f'waiting for workers on {address}...')
+    async with server:
+        if len(games) > 0:
+            await finished.wait()
+
+def run_worker(address, exec_command=None, player_command=None):
+    """Plays the games handed out by the coordinate() at address, host:port,
+    until it has no more, and replies with their outcome. The games are
+    played by the Python player_command loaded in process, or else by
+    running exec_command, which must be those of the coordinator; only the
+    targets, rules and seed of the games are taken from it."""
+    sock = socket.create_connection(parse_host_port(address))
+    (in_file, out_file) = (sock.makefile('rb'), sock.makefile('wb'))
+    out_file.write(bytes(json.dumps({'exec': exec_command, 'player': player_command}) + '\n', 'utf-8'))
+    out_file.flush()
+    line = in_file.readline()
+    if len(line) == 0:
+        raise ValueError(f'{address} closed the connection')
+    setup = json.loads(line)
+    if 'error' in setup:
+        raise ValueError(f'{address}: {setup["error"]}')
+    solver = None
+    if player_command is not None:
+        session = PlayerSession(load_player(player_command))
+    else:
+        (in_pipe, out_pipe, solver) = start_solver(exec_command)
+        session = TextSession(in_pipe, out_pipe)
+        (_, session.pending) = negotiate(in_pipe, out_pipe)
+    valid_words = set(setup['valid_words'])
+    while True:
+        line = in_file.readline()
+        games = json.loads(line) if len(line) > 0 else None
+        if games is None:
             break
+        records = []
+        for (game_id, targets) in games:
+            seed_player(setup['seed'], game_id)
+            referee = play_game(session, targets, valid_words, setup['max_attempts'], Statistics(), setup['hard'])
+            records.append({'game_id': game_id, 'targets': referee.targets, 'outcome': referee.outcome,
+                            'attempt': referee.attempt, 'moves': referee.moves, 'stats': referee.stats.state()})
+        out_file.write(bytes(json.dumps(records) + '\n', 'utf-8'))
+        out_file.flush()
+    if solver is not None:
+        out_pipe.close()
+        if isinstance(solver, socket.socket):
+            solver.close()
         else:
-            resp = evaluate(guess, target)
-            if attempt != max_attempts:
-                logger.debug('sending %s , attempt %d', resp, attempt)
-                if out_pipe == sys.stdout:
-                    print(f"{resp}\n")
+            solver.terminate()
+    sock.close()
+
+# The state of a tournament worker process, set by init_tournament_worker().
+tournament = {}
+
+def init_tournament_worker(player_commands, valid_words, max_attempts, hard, adversarial_targets, seed):
+    tournament['player_commands'] = player_commands
+    tournament['seed'] = seed
+    tournament['sessions'] = {}
+    tournament['valid_words'] = valid_words
+    tournament['max_attempts'] = max_attempts
+    tournament['hard'] = hard
+    tournament['fm'] = None
+    if adversarial_targets is not None:
+        tournament['fm'] = FeedbackMatrix(sorted(valid_words), adversarial_targets)
+
+def play_tournament_games(player_id, games):
+    """Plays games, a list of (game_id, targets), against player player_id,
+    loaded once per worker, and returns its Statistics and the
+    game_record() of each game. The random module is seeded before each
+    game with seed_player(), so the games of players using it do not depend
+    on the worker that plays them."""
+    sessions = tournament['sessions']
+    if player_id not in sessions:
+        sessions[player_id] = PlayerSession(load_player(tournament['player_commands'][player_id]))
+    stats = Statistics()
+    records = []
+    for (game_id, targets) in games:
+        seed_player(tournament['seed'], game_id, player_id)
+        referee = play_game(sessions[player_id], targets, tournament['valid_words'], tournament['max_attempts'], stats, tournament['hard'], tournament['fm'])
+        records.append(game_record(game_id, referee))
+    return (stats, records)
+
+def run_tournament(player_commands, games, valid_words, max_attempts, workers, hard=False, adversarial_targets=None, game_records=None, seed=0):
+    """Plays the same games, a list of (game_id, targets), against every
+    player, on a pool of workers processes each loading the players in
+    process, and returns the Statistics of each player.
+    game_records(player_id, records) is called with the game_record() of
+    the games as they are played. seed seeds the random module of every
+    game, see play_tournament_games()."""
+    initargs = (player_commands, valid_words, max_attempts, hard, adversarial_targets, seed)
+    chunk = max(1, math.ceil(len(games) / (workers * 4)))
+    work = [(player_id, games[i:i + chunk]) for player_id in range(len(player_commands)) for i in range(0, len(games), chunk)]
+    results = [Statistics() for _ in player_commands]
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=init_tournament_worker, initargs=initargs) as executor:
+            futures = {executor.submit(play_tournament_games, *w): w[0] for w in work}
+            done = ((futures[f], f.result()) for f in concurrent.futures.as_completed(futures))
+            for (player_id, (stats, records)) in done:
+                results[player_id].merge(stats)
+                if game_records is not None:
+                    game_records(player_id, records)
+    else:
+        init_tournament_worker(*initargs)
+        for w in work:
+            (stats, records) = play_tournament_games(*w)
+            results[w[0]].merge(stats)
+            if game_records is not None:
+                game_records(w[0], records)
+    return results
+
+def display_ranking(player_commands, results):
+    """Table of the players, best score first."""
+    ranked = sorted(zip(player_commands, results), key=lambda p: (p[1].score(), p[0]))
+    width = max([len('Player')] + [len(c) for c in player_commands])
+    ret = f"{'Rank':>4}  {'Player':<{width}}  {'Wins':>6} {'Losses':>6} {'Surr':>6} {'Mean':>7} {'Stddev':>7} {'Score':>7} {'ms/guess':>9}\n"
+    for (rank, (command, stats)) in enumerate(ranked, 1):
+        mean = stats.mean() if stats.wins > 0 else float('nan')
+        stddev = stats.stddev() if stats.wins > 0 else float('nan')
+        ret += f'{rank:>4}  {command:<{width}}  {stats.wins:>6} {stats.losses:>6} {stats.gave_up:>6} {mean:>7.4f} {stddev:>7.3f} {stats.score():>7} {stats.latency() * 1000:>9.3f}\n'
+    return ret
+
+##############################################################################
+logging.basicConfig()
+logger = logging.getLogger('wordle.py')
+
+def print_settings(args, dict_filename):
+    print(f'Dictionary: {dict_filename}  Word Length: {args.word_length}  Seed: {args.seed}')
+    if args.exhaust:
+        print('Exhaust dictionary')
+    if args.hard:
+        print('Hard mode')
+    if args.boards > 1:
+        print(f'Boards: {args.boards}')
+    if args.adversarial:
+        print('Adversarial')
+    if args.shard != '0/1':
+        print(f'Shard: {args.shard}')
+
+def terminate(signum, frame):
+    """Exits on SIGTERM as on other interruptions, closing the outputs and
+    saving the checkpoint of the games completed."""
+    raise SystemExit(128 + signum)
+
+def main():
+    parser = argparse.ArgumentParser(description='Wordle')
+    parser.add_argument('num_games', type=int, default=1, nargs='?', help='number_of_games')
+    parser.add_argument('word_length', type=int, default=5, nargs='?', help='length of word')
+    parser.add_argument('--seed', type=int, default=int(time.time()), help='random number seed')
+    parser.add_argument('--exhaust', action='store_true', default=False, help='Systematically play with every word in the dictionary')
+    parser.add_argument('--shard', type=str, default='0/1', help='Play only shard i/n of the games, those whose number modulo n is i')
+    parser.add_argument('--exec', type=str, default=None, help='Program to run to play Wordle, or unix:PATH to play a child of solver.py --fork_server PATH')
+    parser.add_argument('--player', type=str, action='append', default=None, help='Command line of a Python Wordle solver, as for --exec, to load and play in process. Give several to play a tournament')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes playing a tournament')
+    parser.add_argument('--processes', type=int, default=1, help='Number of copies of the --exec program playing in parallel, each a slice of the games')
+    parser.add_argument('--in_flight', type=int, default=1, help='Number of games the --exec program plays at once, if it offers protocol 2, as solver.py --game --offer_protocol_2 does')
+    parser.add_argument('--timeout', type=float, default=None, help='Seconds a --processes program may take to guess before it loses the game and is restarted, or a --worker may take per game before its games are handed to another')
+    parser.add_argument('--tree', action='store_true', default=False, help='Play every game at once against a deterministic --player, asking it for one guess per node of its decision tree')
+    parser.add_argument('--coordinate', type=str, default=None, help='Hand the games out to the --worker processes that connect to host:port, instead of playing them. Workers are not authenticated and their results are trusted, so listen only on a trusted network')
+    parser.add_argument('--worker', type=str, default=None, help='Play the games handed out by the --coordinate run at host:port with the same --exec or --player, which the coordinator checks')
+    parser.add_argument('--hard', action='store_true', default=False, help='Every guess must use all of the hints revealed so far')
+    parser.add_argument('--boards', type=int, default=1, help='Number of boards, each with its own target, played simultaneously')
+    parser.add_argument('--adversarial', action='store_true', default=False, help='Do not fix the target, and reply with the feedback leaving the most possible targets (Absurdle)')
+    parser.add_argument('--checkpoint', type=str, default=None, help='File to save the completed games and their statistics to as the run goes')
+    parser.add_argument('--checkpoint_interval', type=float, default=60, help='Seconds between saves of the --checkpoint')
+    parser.add_argument('--resume', action='store_true', default=False, help='Continue the run saved in the --checkpoint, if there is one, skipping its completed games')
+    parser.add_argument('--trace', type=str, default=None, help='File to write a line of JSON to for every game, with its targets, guesses, feedback codes and the seconds taken per guess')
+    parser.add_argument('--results_db', type=str, default=None, help='SQLite database to add the outcome of every game to, as a run per player')
+    parser.add_argument('--debug', action='store_true', default=False)
+    parser.add_argument('--verbose', action='store_true', default=False)
+    parser.add_argument('--dictionary_dir', type=str, default='./dicts', help='Directory containing dictionaries')
+    parser.add_argument('--dictionary', type=str, default='5_letter_wordle_targets.txt', help='Alternate dictionary')
+    parser.add_argument('--guess_dictionaries', type=str, default=None, help='CSV of dictionary files of additional valid guesses')
+    args = parser.parse_args()
+    if args.hard and args.boards > 1:
+        parser.error('--hard is only supported with a single board')
+    if args.adversarial and (args.boards > 1 or args.exhaust):
+        parser.error('--adversarial is only supported with a single board, and without --exhaust')
+    if args.exec is not None and args.player is not None:
+        parser.error('--exec and --player are mutually exclusive')
+    if args.processes > 1 and (args.exec is None or args.adversarial):
+        parser.error('--processes requires --exec, and does not support --adversarial')
+    if args.in_flight > 1 and (args.exec is None or args.adversarial or args.processes > 1):
+        parser.error('--in_flight requires --exec, and does not support --adversarial or --processes')
+    if args.coordinate is not None and (args.exec is None and args.player is None or args.player is not None and len(args.player) > 1 or args.adversarial or args.processes > 1 or args.in_flight > 1):
+        parser.error('--coordinate requires --exec or a single --player, and does not support --adversarial, --processes or --in_flight')
+    if args.worker is not None and (args.exec is None and args.player is None or args.player is not None and len(args.player) > 1 or args.processes > 1 or args.in_flight > 1):
+        parser.error('--worker requires the --exec or single --player of the coordinator, and does not support --processes or --in_flight')
+    if args.tree and (args.player is None or len(args.player) > 1 or args.boards > 1 or args.adversarial or args.coordinate is not None):
+        parser.error('--tree requires a single --player, and does not support --boards, --adversarial or --coordinate')
+    if args.resume and args.checkpoint is None:
+        parser.error('--resume requires --checkpoint')
+    if (args.checkpoint is not None or args.trace is not None) and args.player is not None and len(args.player) > 1:
+        parser.error('--checkpoint and --trace are not supported with a tournament')
+    try:
+        shard = parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(f'--shard: {e}')
+    word_length = args.word_length
+    seed = args.seed
+
+    signal.signal(signal.SIGTERM, terminate)
+
+    if args.verbose:
+        logger.setLevel(logging.INFO)
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+
+    if args.worker is not None:
+        try:
+            run_worker(args.worker, args.exec, args.player and args.player[0])
+        except ValueError as e:
+            parser.error(str(e))
+        return
+
+    dict_filename = os.path.join(args.dictionary_dir, args.dictionary)
+
+    print(f'loading {dict_filename}...')
+    d = Dictionary(dict_filename, word_length)
+    valid_words = set(d.words)
+    if args.guess_dictionaries is not None:
+        for filename in args.guess_dictionaries.split(','):
+            filename = os.path.join(args.dictionary_dir, filename.strip())
+            print(f'loading {filename}...')
+            valid_words.update(Dictionary(filename, word_length).words)
+
+    settings = {k: getattr(args, k) for k in ('num_games', 'word_length', 'exhaust', 'shard', 'exec', 'player', 'hard', 'boards', 'adversarial', 'dictionary', 'guess_dictionaries')}
+    checkpoint = None
+    if args.checkpoint is not None:
+        checkpoint = Checkpoint(args.checkpoint, settings, seed, args.checkpoint_interval)
+        if args.resume and os.path.exists(args.checkpoint):
+            try:
+                checkpoint.load()
+            except ValueError as e:
+                parser.error(str(e))
+            seed = args.seed = checkpoint.seed
+            print(f'resuming after {len(checkpoint.done)} games...')
+    random.seed(seed)
+    # a resumed run adds the games left to the trace of the games done
+    trace = None
+    if args.trace is not None:
+        trace = Trace(args.trace, append=checkpoint is not None and len(checkpoint.done) > 0)
+    store = None
+    if args.results_db is not None:
+        store = ResultsStore(args.results_db)
+    if checkpoint is not None:
+        checkpoint.outputs = [output for output in (trace, store) if output is not None]
+
+    max_attempts = word_length + args.boards
+    if args.player is not None and len(args.player) > 1:
+        games = list(choose_targets(d, args.num_games, args.exhaust, args.boards, seed, shard))
+        game_records = None
+        if store is not None:
+            runs = [store.start_run(player, settings, seed) for player in args.player]
+            game_records = lambda player_id, records: store.add(runs[player_id], records)
+        print(f'running a tournament of {len(args.player)} players...')
+        try:
+            results = run_tournament(args.player, games, valid_words, max_attempts, args.workers, args.hard, d.words if args.adversarial else None, game_records, seed)
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            if store is not None:
+                store.close()
+        print()
+        print_settings(args, dict_filename)
+        print(f'Played: {len(games)} games each')
+        print(display_ranking(args.player, results))
+        return
+
+    solver = None
+    multiplexed = False
+    if args.player is not None and args.coordinate is None:
+        try:
+            session = PlayerSession(load_player(args.player[0]))
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.coordinate is not None or args.processes > 1:
+        session = None
+    elif args.exec is not None:
+        (in_pipe, out_pipe, solver) = start_solver(args.exec)
+        session = TextSession(in_pipe, out_pipe)
+        (multiplexed, session.pending) = negotiate(in_pipe, out_pipe, args.in_flight > 1)
+        if args.in_flight > 1 and not multiplexed:
+            logger.warning('%s made no protocol 2 offer, so it plays one game at a time (solver.py needs --offer_protocol_2)', args.exec)
+    else:
+        session = TextSession(sys.stdin, sys.stdout)
+
+    fm = None
+    if args.adversarial:
+        fm = FeedbackMatrix(sorted(valid_words), d.words)
+
+    if store is not None:
+        # a resumed run adds the games left to the run of the games done
+        if checkpoint is not None and checkpoint.run is not None:
+            run = checkpoint.run
+        else:
+            run = store.start_run(args.exec if args.player is None else args.player[0], settings, seed)
+        if checkpoint is not None:
+            checkpoint.run = run
+
+    def game_over(game_id, referee):
+        if store is not None:
+            store.add(run, [game_record(game_id, referee)])
+        if trace is not None:
+            trace.write(game_id, referee)
+        if checkpoint is not None:
+            checkpoint.completed(game_id, referee.stats)
+
+    stats = Statistics()
+    games = [(game_id, targets) for (game_id, targets) in choose_targets(d, args.num_games, args.exhaust, args.boards, seed, shard) if checkpoint is None or game_id not in checkpoint.done]
+    print('running...')
+    try:
+        if multiplexed:
+            play_multiplexed(in_pipe, out_pipe, games, valid_words, max_attempts, stats, args.hard, args.in_flight, game_over)
+        elif args.tree:
+            play_tree(session.player, games, valid_words, max_attempts, stats, args.hard, game_over, seed)
+        elif args.coordinate is not None:
+            player = {'exec': args.exec, 'player': args.player and args.player[0]}
+            setup = {'valid_words': sorted(valid_words), 'max_attempts': max_attempts, 'hard': args.hard, 'seed': seed}
+            asyncio.run(coordinate(args.coordinate, player, setup, games, stats, game_over, timeout=args.timeout))
+        elif args.processes > 1:
+            stats = run_processes(args.exec, games, valid_words, max_attempts, args.processes, args.hard, args.timeout, game_over)
+        else:
+            for (game_id, targets) in games:
+                if args.adversarial:
+                    logger.info("New adversarial game (%d / %d)", game_id, args.num_games)
                 else:
-                    safe_write(out_pipe, f"{resp}\n")
-        attempt += 1
-
-    if not correct and not gave_up:
-        safe_write(out_pipe, f"YOU LOSE\n")
-        if out_pipe == sys.stdout:
-            safe_write(out_pipe, f"The word was {target}\n\n")
-        stats.lose()
-        logger.info('Player lost. %s != %s Attempts %d', target, guess, attempt)
-
-if p is not None:
-    p.stdin.close()
-    p.terminate()
-
-print()
-print(f'Player: {args.exec}')
-print(f'Dictionary: {dict_filename}  Word Length: {args.word_length}  Seed: {seed}')
-if args.exhaust:
-    print('Exhaust dictionary')
-print(f'Wins {stats.wins} Losses: {stats.losses} Surrenders: {stats.gave_up} Played: {stats.played()} WinPct {(stats.wins / stats.played() * 100):.3f} %')
-print(f'Number of attempts to win: mean: {stats.mean():3f} stddev: {stats.stddev():.3f}')
-print(f'Score (lower better) {stats.score()}')
-print('Winning Histogram')
-print(stats.display_histogram())
+                    logger.info("New game (%d / %d). target: %s", game_id, args.num_games, ', '.join(targets))
+                seed_player(seed, game_id)
+                referee = play_game(session, targets, valid_words, max_attempts, Statistics(), args.hard, fm)
+                stats.merge(referee.stats)
+                game_over(game_id, referee)
+    finally:
+        # an interrupted run keeps every game it completed
+        if checkpoint is not None:
+            checkpoint.save()
+        if trace is not None:
+            trace.close()
+        if store is not None:
+            store.close()
+    if checkpoint is not None:
+        stats = checkpoint.stats
+
+    if solver is not None:
+        out_pipe.close()
+        if isinstance(solver, socket.socket):
+            solver.close()
+        else:
+            solver.terminate()
+
+    print()
+    if args.player is not None:
+        print(f'Player: {args.player[0]} (in process)')
+    else:
+        print(f'Player: {args.exec}')
+    print_settings(args, dict_filename)
+    if args.processes > 1:
+        print(f'Processes: {args.processes}')
+    if multiplexed:
+        print(f'Games in flight: {args.in_flight}')
+    if args.coordinate is not None:
+        print(f'Coordinated on {args.coordinate}')
+    if args.tree:
+        print('Decision tree')
+    # a shard may have no games, and a run no wins
+    mean = stats.mean() if stats.wins > 0 else float('nan')
+    stddev = stats.stddev() if stats.wins > 0 else float('nan')
+    print(f'Wins {stats.wins} Losses: {stats.losses} Surrenders: {stats.gave_up} Played: {stats.played()} WinPct {(stats.wins / max(stats.played(), 1) * 100):.3f} %')
+    print(f'Number of attempts to win: mean: {mean:3f} stddev: {stddev:.3f}')
+    print(f'Score (lower better) {stats.score()}')
+    print('Winning Histogram')
+    print(stats.display_histogram())
+
+if __name__ == '__main__':
+    main()